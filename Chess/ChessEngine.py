@@ -3,9 +3,37 @@ This class is responsible for storing all the info about the current state of a
 game. It will also be responsible for determining the valid moves at the current
 state. It will also keep a move log
 '''
+import re
+import struct
+
+from Chess import evaluation, zobrist
+from Chess.bitboard import BitBoards
+from Chess.mailbox import Mailbox
+
+# squares a knight or king on (r, c) reaches, and the squares along each ray from (r, c),
+# precomputed so attack queries don't need any bounds checks
+KNIGHT_SQUARES = [[[(r + dr, c + dc) for dr, dc in ((-2,-1),(-2,1),(-1,-2),(-1,2),(1,-2),(1,2),(2,-1),(2,1))
+                    if 0 <= r + dr < 8 and 0 <= c + dc < 8] for c in range(8)] for r in range(8)]
+KING_SQUARES = [[[(r + dr, c + dc) for dr, dc in ((-1,-1),(-1,0),(-1,1),(0,-1),(0,1),(1,-1),(1,0),(1,1))
+                  if 0 <= r + dr < 8 and 0 <= c + dc < 8] for c in range(8)] for r in range(8)]
+ORTHOGONAL_RAYS = [[[[(r + dr * i, c + dc * i) for i in range(1, 8) if 0 <= r + dr * i < 8 and 0 <= c + dc * i < 8]
+                     for dr, dc in ((-1, 0), (0, -1), (1, 0), (0, 1))] for c in range(8)] for r in range(8)]
+DIAGONAL_RAYS = [[[[(r + dr * i, c + dc * i) for i in range(1, 8) if 0 <= r + dr * i < 8 and 0 <= c + dc * i < 8]
+                   for dr, dc in ((-1, -1), (-1, 1), (1, -1), (1, 1))] for c in range(8)] for r in range(8)]
+
+# binary snapshot of a position (GameState.pack/unpack), 38 bytes: the 64 squares as 4-bit piece codes two to a
+# byte, side to move and castling rights as bit flags, the en passant file + 1 (0 for none), the halfmove clock
+# and the fullmove number
+SNAPSHOT = struct.Struct('<32sBBHH')
+SNAPSHOT_PIECES = ('--', 'wP', 'wN', 'wB', 'wR', 'wQ', 'wK', 'bP', 'bN', 'bB', 'bR', 'bQ', 'bK')
+SNAPSHOT_CODES = {piece: code for code, piece in enumerate(SNAPSHOT_PIECES)}
+
+# a SAN move once the check/mate marks and annotation glyphs are stripped: piece, start file, start rank,
+# capture, end square and promotion piece (castling is handled apart)
+SAN_PATTERN = re.compile(r'([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
 
 class GameState:
-    def __init__(self):
+    def __init__(self, bitboard=False, debug_hash=False, mailbox=False):
         # board is an 8*8 2-D list and each element has two char.
         # The first char is color of piece and second is type.
 
@@ -33,11 +61,44 @@ class GameState:
         self.current_castling_right = CastlingRights(True, True, True, True)
         self.castle_rights_log = [CastlingRights(self.current_castling_right.wks, self.current_castling_right.bks, self.current_castling_right.wqs,  self.current_castling_right.bqs)]
 
+        # optional bitboard backend, when it is on it generates the moves and make/undo keep it in sync
+        self.bitboards = BitBoards(self.board) if bitboard else None
+        # or the 10x12 mailbox backend (see mailbox.py), the same way
+        self.mailbox = Mailbox(self.board) if mailbox else None
+        self.pins = []  # filled in by get_valid_moves while it generates moves
+        self.checks = []
+        self.captures_only = False  # set by get_valid_captures, the piece move functions then skip quiet moves
+        self.attack_maps = {}  # attack_map() per color for the current position, emptied on every make/undo
+
+        # 64-bit Zobrist key of the position, updated incrementally by make_move/undo_move.
+        # With debug_hash on, every make/undo also checks it against a full recompute.
+        self.hash_key = self.compute_hash()
+        self.debug_hash = debug_hash
+
+        # keys of every position of the game so far (the current one last) and how many times each
+        # occurs among them, so a repetition is a dict lookup. halfmove_clock counts the plies since the
+        # last capture or pawn move, for the fifty-move rule
+        self.hash_log = [self.hash_key]
+        self.position_counts = {self.hash_key: 1}
+        self.halfmove_clock = 0
+        self.halfmove_clock_log = [self.halfmove_clock]
+        self.fullmove_number = 1  # goes up after every black move, like in FEN
+
+        # material + piece-square scores (see evaluation.py) and game phase, also updated by make_move/undo_move
+        self.mg_score, self.eg_score, self.phase = evaluation.compute_scores(self.board)
+
     def make_move(self, move):
         self.board[move.start_row][move.start_col] = '--'
         self.board[move.end_row][move.end_col] = move.piece_moved
         self.move_log.append(move)
         self.white_to_move = not self.white_to_move
+        if self.white_to_move:
+            self.fullmove_number += 1
+        self.attack_maps = {}
+        if self.bitboards is not None:
+            self.bitboards.toggle_move(move)
+        elif self.mailbox is not None:
+            self.mailbox.make_move(move)
 
         # updating king move
         if move.piece_moved == 'wK':
@@ -47,7 +108,7 @@ class GameState:
 
         # pawn promotion
         if move.is_pawn_promotion:
-            self.board[move.end_row][move.end_col] = move.piece_moved[0] + 'Q'
+            self.board[move.end_row][move.end_col] = move.piece_moved[0] + move.promotion_piece
 
         # en passant move update the board to capture the pawn
         if move.is_enpassant_move:
@@ -75,13 +136,42 @@ class GameState:
         self.update_castle_rights(move)
         self.castle_rights_log.append(CastlingRights(self.current_castling_right.wks, self.current_castling_right.bks, self.current_castling_right.wqs, self.current_castling_right.bqs))
 
+        self.hash_key ^= self.hash_delta(move)
+        self.update_scores(move, 1)
+        if self.debug_hash:
+            self.check_hash(move)
+
+        # position history, captures and pawn moves can't be undone so they reset the fifty-move count
+        if move.piece_moved[1] == 'P' or move.piece_captured != '--':
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        self.halfmove_clock_log.append(self.halfmove_clock)
+        self.hash_log.append(self.hash_key)
+        self.position_counts[self.hash_key] = self.position_counts.get(self.hash_key, 0) + 1
 
     def undo_move(self):
         if len(self.move_log) !=0:  # make sure there is a move to undo
             move = self.move_log.pop()
+            self.hash_log.pop()
+            if self.position_counts[self.hash_key] == 1:
+                del self.position_counts[self.hash_key]
+            else:
+                self.position_counts[self.hash_key] -= 1
+            self.halfmove_clock_log.pop()
+            self.halfmove_clock = self.halfmove_clock_log[-1]
+            self.hash_key ^= self.hash_delta(move)  # while the logs still hold the rights after the move
+            self.update_scores(move, -1)
             self.board[move.start_row][move.start_col] = move.piece_moved
             self.board[move.end_row][move.end_col] = move.piece_captured
             self.white_to_move = not self.white_to_move  # switch turns back
+            if not self.white_to_move:
+                self.fullmove_number -= 1
+            self.attack_maps = {}
+            if self.bitboards is not None:
+                self.bitboards.toggle_move(move)
+            elif self.mailbox is not None:
+                self.mailbox.undo_move(move)
 
             # updating king move if needed
             if move.piece_moved == 'wK':
@@ -114,6 +204,304 @@ class GameState:
             # also
             self.checkmate = False
             self.stalemate = False
+            if self.debug_hash:
+                self.check_hash(move)
+
+    '''
+    Null move for null-move pruning: the side to move passes. Only the side to move, the en passant
+    square and the hash key change, the move log and the position history are left alone, and
+    undo_null_move() has to come before any undo_move().'''
+    def make_null_move(self):
+        self.hash_key ^= zobrist.BLACK_TO_MOVE_KEY ^ zobrist.enpassant_key(self.enpassant_possible)
+        self.white_to_move = not self.white_to_move
+        self.enpassant_possible = ()
+        self.enpassant_possible_logs.append(self.enpassant_possible)
+        self.attack_maps = {}
+
+    def undo_null_move(self):
+        self.enpassant_possible_logs.pop()
+        self.enpassant_possible = self.enpassant_possible_logs[-1]
+        self.white_to_move = not self.white_to_move
+        self.hash_key ^= zobrist.BLACK_TO_MOVE_KEY ^ zobrist.enpassant_key(self.enpassant_possible)
+        self.attack_maps = {}
+
+    # does the side to move have a piece besides its king and pawns, without one zugzwang is common
+    def has_non_pawn_material(self):
+        color = 'w' if self.white_to_move else 'b'
+        for row in self.board:
+            for square in row:
+                if square[0] == color and square[1] != 'P' and square[1] != 'K':
+                    return True
+        return False
+
+    '''
+    The Zobrist key bits a move flips: the moving piece (the promotion piece on the end square after a promotion),
+    the captured piece (beside the end square for en passant), the rook of a castle move, the side to
+    move, and the castling rights / en passant file before and after the move.
+    XOR is its own inverse, so undo_move applies the same delta before it pops the logs.'''
+    def hash_delta(self, move):
+        keys = zobrist.PIECE_KEYS
+        delta = keys[move.piece_moved][move.start_row][move.start_col] ^ zobrist.BLACK_TO_MOVE_KEY
+        if move.is_pawn_promotion:
+            delta ^= keys[move.piece_moved[0] + move.promotion_piece][move.end_row][move.end_col]
+        else:
+            delta ^= keys[move.piece_moved][move.end_row][move.end_col]
+        if move.piece_captured != '--':
+            if move.is_enpassant_move:
+                delta ^= keys[move.piece_captured][move.start_row][move.end_col]
+            else:
+                delta ^= keys[move.piece_captured][move.end_row][move.end_col]
+        if move.is_castle_move:
+            rook = keys[move.piece_moved[0] + 'R'][move.end_row]
+            if move.end_col - move.start_col == 2:  # kingside
+                delta ^= rook[7] ^ rook[5]
+            else:  # queenside
+                delta ^= rook[0] ^ rook[3]
+        delta ^= zobrist.castling_key(self.castle_rights_log[-2]) ^ zobrist.castling_key(self.castle_rights_log[-1])
+        delta ^= zobrist.enpassant_key(self.enpassant_possible_logs[-2]) ^ zobrist.enpassant_key(self.enpassant_possible_logs[-1])
+        return delta
+
+    # add (sign 1, make_move) or take away (sign -1, undo_move) the evaluation change of a move:
+    # the piece leaving its square, the piece (the promotion piece after a promotion) on the end square,
+    # the captured piece (beside the end square for en passant) and the castling rook
+    def update_scores(self, move, sign):
+        mg, eg = evaluation.MG_VALUES, evaluation.EG_VALUES
+        moved = move.piece_moved
+        placed = moved[0] + move.promotion_piece if move.is_pawn_promotion else moved
+        mg_change = mg[placed][move.end_row][move.end_col] - mg[moved][move.start_row][move.start_col]
+        eg_change = eg[placed][move.end_row][move.end_col] - eg[moved][move.start_row][move.start_col]
+        phase_change = evaluation.PHASE[placed] - evaluation.PHASE[moved]
+        captured = move.piece_captured
+        if captured != '--':
+            row = move.start_row if move.is_enpassant_move else move.end_row
+            mg_change -= mg[captured][row][move.end_col]
+            eg_change -= eg[captured][row][move.end_col]
+            phase_change -= evaluation.PHASE[captured]
+        if move.is_castle_move:
+            rook = moved[0] + 'R'
+            rook_from, rook_to = (7, 5) if move.end_col - move.start_col == 2 else (0, 3)
+            mg_change += mg[rook][move.end_row][rook_to] - mg[rook][move.end_row][rook_from]
+            eg_change += eg[rook][move.end_row][rook_to] - eg[rook][move.end_row][rook_from]
+        self.mg_score += sign * mg_change
+        self.eg_score += sign * eg_change
+        self.phase += sign * phase_change
+
+    # full recompute of the Zobrist key
+    def compute_hash(self):
+        return zobrist.compute_hash(self.board, self.white_to_move, self.current_castling_right, self.enpassant_possible)
+
+    def check_hash(self, move):
+        assert self.hash_key == self.compute_hash(), 'hash_key out of sync after ' + move.get_chess_notation()
+
+    # starts the position history over from the current position, for a position set up by hand
+    def reset_history(self, halfmove_clock=0):
+        self.hash_log = [self.hash_key]
+        self.position_counts = {self.hash_key: 1}
+        self.halfmove_clock = halfmove_clock
+        self.halfmove_clock_log = [halfmove_clock]
+
+    '''
+    Sets up the position described by board (8 rows of 8 squares, copied), the side to move, a CastlingRights,
+    the en passant square (() for none) and the move counters, with an empty move log. Everything derived from
+    the board (king squares, hash key, scores, the bitboard or mailbox backend) is built again. A castling right
+    whose king or rook isn't on its home square is dropped, the move generators take both for granted.'''
+    def set_position(self, board, white_to_move, castling_rights, enpassant_possible=(), halfmove_clock=0, fullmove_number=1):
+        self.board = [list(row) for row in board]
+        for r, row in enumerate(self.board):
+            for c, square in enumerate(row):
+                if square == 'wK':
+                    self.white_king_location = (r, c)
+                elif square == 'bK':
+                    self.black_king_location = (r, c)
+        self.white_to_move = white_to_move
+        self.move_log = []
+        self.checkmate = False
+        self.stalemate = False
+        self.attack_maps = {}
+        board = self.board
+        castling_rights = CastlingRights(castling_rights.wks and board[7][4] == 'wK' and board[7][7] == 'wR',
+                                         castling_rights.bks and board[0][4] == 'bK' and board[0][7] == 'bR',
+                                         castling_rights.wqs and board[7][4] == 'wK' and board[7][0] == 'wR',
+                                         castling_rights.bqs and board[0][4] == 'bK' and board[0][0] == 'bR')
+        self.current_castling_right = castling_rights
+        self.castle_rights_log = [CastlingRights(castling_rights.wks, castling_rights.bks, castling_rights.wqs, castling_rights.bqs)]
+        self.enpassant_possible = enpassant_possible
+        self.enpassant_possible_logs = [enpassant_possible]
+        if self.bitboards is not None:
+            self.bitboards = BitBoards(self.board)
+        if self.mailbox is not None:
+            self.mailbox = Mailbox(self.board)
+        self.hash_key = self.compute_hash()
+        self.reset_history(halfmove_clock)
+        self.fullmove_number = fullmove_number
+        self.mg_score, self.eg_score, self.phase = evaluation.compute_scores(self.board)
+
+    # a GameState set up from a FEN string, the halfmove clock and fullmove number fields may be left out
+    @classmethod
+    def from_fen(cls, fen, bitboard=False, mailbox=False, debug_hash=False):
+        fields = fen.split()
+        ranks = fields[0].split('/') if fields else []
+        if len(fields) < 4 or len(ranks) != 8 or fields[1] not in ('w', 'b'):
+            raise ValueError('not a FEN string: ' + repr(fen))
+        board = []
+        for rank in ranks:
+            row = []
+            for char in rank:
+                if char.isdigit():
+                    row.extend(['--'] * int(char))
+                elif char.upper() in 'PNBRQK':
+                    row.append(('w' if char.isupper() else 'b') + char.upper())
+                else:
+                    raise ValueError('not a FEN string: ' + repr(fen))
+            if len(row) != 8:
+                raise ValueError('not a FEN string: ' + repr(fen))
+            board.append(row)
+        for king in ('wK', 'bK'):
+            if sum(row.count(king) for row in board) != 1:
+                raise ValueError('not one %s king: %r' % ('white' if king == 'wK' else 'black', fen))
+        rights = fields[2]
+        if rights != '-' and (not rights or any(char not in 'KQkq' for char in rights)):
+            raise ValueError('bad castling rights %r: %r' % (rights, fen))
+        enpassant = ()
+        if fields[3] != '-':
+            # the square behind a pawn of the side that just moved, rank 6 with white to move and 3 with black
+            square = fields[3]
+            if len(square) != 2 or square[0] not in Move.files_to_cols or square[1] != ('6' if fields[1] == 'w' else '3'):
+                raise ValueError('bad en passant square %r: %r' % (square, fen))
+            enpassant = (Move.ranks_to_rows[square[1]], Move.files_to_cols[square[0]])
+        gs = cls(bitboard, debug_hash, mailbox)
+        gs.set_position(board, fields[1] == 'w', CastlingRights('K' in rights, 'k' in rights, 'Q' in rights, 'q' in rights),
+                        enpassant, int(fields[4]) if len(fields) > 4 else 0, int(fields[5]) if len(fields) > 5 else 1)
+        return gs
+
+    # FEN string of the position, all six fields
+    def to_fen(self):
+        ranks = []
+        for row in self.board:
+            rank = ''
+            empty = 0
+            for square in row:
+                if square == '--':
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += square[1] if square[0] == 'w' else square[1].lower()
+            ranks.append(rank + (str(empty) if empty else ''))
+        rights = self.current_castling_right
+        castling = ('K' if rights.wks else '') + ('Q' if rights.wqs else '') + ('k' if rights.bks else '') + ('q' if rights.bqs else '')
+        enpassant = '-'
+        if self.enpassant_possible:
+            r, c = self.enpassant_possible
+            enpassant = Move.cols_to_files[c] + Move.rows_to_ranks[r]
+        return ' '.join(('/'.join(ranks), 'w' if self.white_to_move else 'b', castling or '-', enpassant,
+                         str(self.halfmove_clock), str(self.fullmove_number)))
+
+    # the position as a SNAPSHOT.size byte string, for storing many positions or sending one to another process
+    def pack(self):
+        codes = [SNAPSHOT_CODES[square] for row in self.board for square in row]
+        rights = self.current_castling_right
+        flags = self.white_to_move | rights.wks << 1 | rights.wqs << 2 | rights.bks << 3 | rights.bqs << 4
+        return SNAPSHOT.pack(bytes([codes[i] | codes[i + 1] << 4 for i in range(0, 64, 2)]), flags,
+                             self.enpassant_possible[1] + 1 if self.enpassant_possible else 0,
+                             min(self.halfmove_clock, 0xFFFF), min(self.fullmove_number, 0xFFFF))
+
+    # a GameState set up from the bytes pack() returned
+    @classmethod
+    def unpack(cls, data, bitboard=False, mailbox=False, debug_hash=False):
+        squares, flags, enpassant_file, halfmove_clock, fullmove_number = SNAPSHOT.unpack(data)
+        pieces = SNAPSHOT_PIECES
+        board = [[] for _ in range(8)]
+        for i, byte in enumerate(squares):
+            board[i >> 2] += (pieces[byte & 15], pieces[byte >> 4])
+        white_to_move = bool(flags & 1)
+        enpassant = ()
+        if enpassant_file:
+            enpassant = (2 if white_to_move else 5, enpassant_file - 1)  # behind the pawn that just moved two squares
+        gs = cls(bitboard, debug_hash, mailbox)
+        gs.set_position(board, white_to_move, CastlingRights(bool(flags & 2), bool(flags & 8), bool(flags & 4), bool(flags & 16)),
+                        enpassant, halfmove_clock, fullmove_number)
+        return gs
+
+    # how many times the current position has occurred in the game, this time included
+    def repetition_count(self):
+        return self.position_counts[self.hash_key]
+
+    # fifty moves by each side without a capture or a pawn move
+    def is_fifty_move_draw(self):
+        return self.halfmove_clock >= 100
+
+    # drawn by threefold repetition or by the fifty-move rule, checkmate and stalemate are the flags
+    def is_draw(self):
+        return self.position_counts[self.hash_key] >= 3 or self.halfmove_clock >= 100
+
+    '''
+    Standard algebraic notation of a legal move in the current position: the piece letter (none for pawns),
+    the start file, rank or square when another piece of the same kind can go to the same square, x for
+    a capture (a pawn capture starts with the pawn's file), the end square, =piece for a promotion, and +
+    or # when it gives check or mate. valid_moves saves generating the moves again when the caller has them.'''
+    def get_san(self, move, valid_moves=None):
+        if move.is_castle_move:
+            san = 'O-O' if move.end_col > move.start_col else 'O-O-O'
+        else:
+            piece_type = move.piece_moved[1]
+            end_square = move.get_rank_file(move.end_row, move.end_col)
+            capture = 'x' if move.piece_captured != '--' else ''
+            if piece_type == 'P':
+                san = (Move.cols_to_files[move.start_col] + capture if capture else '') + end_square
+                if move.is_pawn_promotion:
+                    san += '=' + move.promotion_piece
+            else:
+                if valid_moves is None:
+                    valid_moves = self.get_valid_moves()
+                rivals = [other for other in valid_moves if other.piece_moved == move.piece_moved and other.end_sq == move.end_sq
+                          and other.start_sq != move.start_sq]
+                start = ''
+                if rivals:
+                    if all(other.start_col != move.start_col for other in rivals):
+                        start = Move.cols_to_files[move.start_col]
+                    elif all(other.start_row != move.start_row for other in rivals):
+                        start = Move.rows_to_ranks[move.start_row]
+                    else:
+                        start = move.get_rank_file(move.start_row, move.start_col)
+                san = piece_type + start + capture + end_square
+        # play the move to see if it checks or mates, get_valid_moves would leave the flags of the position after it
+        checkmate, stalemate = self.checkmate, self.stalemate
+        self.make_move(move)
+        if self.in_check():
+            san += '#' if len(self.get_valid_moves()) == 0 else '+'
+        self.undo_move()
+        self.checkmate, self.stalemate = checkmate, stalemate
+        return san
+
+    # the legal Move a SAN string stands for, ValueError if it isn't exactly one legal move.
+    # Check marks and glyphs (+ # ! ?) are ignored, castling may be written with zeros
+    def parse_san(self, san, valid_moves=None):
+        if valid_moves is None:
+            valid_moves = self.get_valid_moves()
+        text = san.rstrip('+#!?')
+        if text in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+            kingside = len(text) == 3
+            for move in valid_moves:
+                if move.is_castle_move and (move.end_col > move.start_col) == kingside:
+                    return move
+            raise ValueError('illegal move: ' + san)
+        match = SAN_PATTERN.match(text)
+        if match is None:
+            raise ValueError('not a SAN move: ' + san)
+        piece_type, start_file, start_rank, end_square, promotion_piece = match.groups()
+        piece_type = piece_type or 'P'
+        end_row, end_col = Move.ranks_to_rows[end_square[1]], Move.files_to_cols[end_square[0]]
+        candidates = [move for move in valid_moves
+                      if move.piece_moved[1] == piece_type and move.end_row == end_row and move.end_col == end_col
+                      and not move.is_castle_move
+                      and (start_file is None or move.start_col == Move.files_to_cols[start_file])
+                      and (start_rank is None or move.start_row == Move.ranks_to_rows[start_rank])
+                      and move.promotion_piece == (promotion_piece or 'Q' if move.is_pawn_promotion else None)]
+        if len(candidates) != 1:
+            raise ValueError(('ambiguous move: ' if candidates else 'illegal move: ') + san)
+        return candidates[0]
 
     def update_castle_rights(self, move):
         if move.piece_moved == 'wK':
@@ -153,14 +541,16 @@ class GameState:
 
     '''
     We will make a distinction between for all possible moves and all valid moves.
-    So the basic algo for our get_valid_moves() will be:
-    -->get all possible moves
-    --> for each possible move, check to see if it is a valid move by:
-        * make the move
-        * generate all possible moves for the opposing player
-        * see if any of the moves attack the king.
-        * if your king is safe it is a valid move, add it to the list
-        * return the list of valid moves only'''
+    Instead of making every possible move and regenerating all the opponent's moves,
+    get_valid_moves() looks outwards from our king once:
+    --> check_for_pins_and_checks() scans the 8 rays and the knight squares around the king
+        * an enemy piece that attacks along the ray with nothing in between is a check
+        * an enemy piece that attacks along the ray with exactly one of our pieces in between
+          pins that piece, it may only move along the ray
+    --> double check: only the king can move
+    --> single check: the other pieces have to capture the checking piece or block the ray
+    --> the king can only move to squares that are not attacked
+    --> en passant removes two pawns from a row, so it is verified on its own'''
 
     # all moves considering checks
     def get_valid_moves(self):
@@ -169,57 +559,329 @@ class GameState:
             print(log.wks, log.wqs, log.bks, log.bqs, end=', ')
         print()'''
 
-        temp_enpassant_possible = self.enpassant_possible
-        temp_castle_rights = CastlingRights(self.current_castling_right.wks, self.current_castling_right.bks, self.current_castling_right.wqs, self.current_castling_right.bqs)  # copying the curent castling rights
-        # Generate all possible move
-        moves = self.get_all_possible_moves()  # it will generate king moves which will effect the castling rights
-        if self.white_to_move:  # seperating castling moves from king moves to avoid recursion
-            self.get_castle_moves(self.white_king_location[0], self.white_king_location[1], moves)
+        if self.bitboards is not None:  # the bitboard generator only emits legal moves
+            moves = self.bitboards.get_valid_moves(self, Move)
+            in_check = len(moves) == 0 and self.in_check()
+        elif self.mailbox is not None:  # and neither does the mailbox one
+            moves = self.mailbox.get_valid_moves(self, Move)
+            in_check = len(moves) == 0 and self.in_check()
         else:
-            self.get_castle_moves(self.black_king_location[0], self.black_king_location[1], moves)
-
-        # for each move, make the move
-        for i in range(len(moves)-1, -1, -1):  # when removing , go backwards to avoid missing something
-            self.make_move(moves[i])
-
-            # generate all opponent's move
-            # for each opponent move see if they attack your king
-            self.white_to_move = not self.white_to_move  # so that we are checking for our original player
-            if self.in_check():
-                moves.remove(moves[i])   # if king is under attack, not a valid move
-            self.white_to_move = not self.white_to_move
-            self.undo_move()
+            moves, in_check = self.generate_legal_moves()
 
         if len(moves) == 0:  # either checkmate or stalemate
-            if self.in_check():
+            if in_check:
                 self.checkmate = True
             else:
                 self.stalemate = True
         else:
             self.checkmate = False
             self.stalemate = False
+        return moves
 
-        self.enpassant_possible = temp_enpassant_possible
-        self.current_castling_right = temp_castle_rights
+    # only the legal captures and promotions, for the quiescence search. The quiet moves are never
+    # generated, and since an empty list says nothing about mate the checkmate/stalemate flags are left alone
+    def get_valid_captures(self):
+        if self.bitboards is not None:
+            return self.bitboards.get_valid_moves(self, Move, captures_only=True)
+        if self.mailbox is not None:
+            return self.mailbox.get_valid_moves(self, Move, captures_only=True)
+        self.captures_only = True
+        moves = self.generate_legal_moves()[0]
+        self.captures_only = False
         return moves
 
+    # returns the legal moves (just captures and promotions with captures_only set) and if we are in check
+    def generate_legal_moves(self):
+        in_check, self.pins, self.checks = self.check_for_pins_and_checks()
+        if self.white_to_move:
+            king_row, king_col = self.white_king_location
+        else:
+            king_row, king_col = self.black_king_location
+
+        if len(self.checks) > 1:  # double check, king has to move
+            moves = []
+            self.get_king_moves(king_row, king_col, moves)
+        else:
+            moves = self.get_all_possible_moves()
+            if in_check:  # only capture the checking piece or block the check
+                check_row, check_col, d_row, d_col = self.checks[0]
+                valid_squares = []  # squares that pieces can move to
+                if self.board[check_row][check_col][1] == 'N':  # knight can't be blocked
+                    valid_squares = [(check_row, check_col)]
+                else:
+                    for i in range(1, 8):
+                        valid_square = (king_row + d_row * i, king_col + d_col * i)
+                        valid_squares.append(valid_square)
+                        if valid_square == (check_row, check_col):  # once we get to the checking piece
+                            break
+                # en passant moves were already verified against the check
+                moves = [move for move in moves if move.piece_moved[1] == 'K' or move.is_enpassant_move
+                         or (move.end_row, move.end_col) in valid_squares]
+            elif not self.captures_only:
+                self.get_castle_moves(king_row, king_col, moves)
+
+        self.pins = []  # pins only apply while generating our own moves
+        return moves, in_check
+
+    '''
+    Scans out from the king of the player to move, returns (in_check, pins, checks).
+    pins and checks hold (row, col, row direction, col direction) of the pinned piece or of the
+    checking piece, direction being the way from the king to that square.'''
+    def check_for_pins_and_checks(self):
+        pins = []  # squares where the allied pinned piece is and direction pinned from
+        checks = []  # squares where enemy is applying a check
+        in_check = False
+        if self.white_to_move:
+            enemy_color, ally_color = 'b', 'w'
+            start_row, start_col = self.white_king_location
+        else:
+            enemy_color, ally_color = 'w', 'b'
+            start_row, start_col = self.black_king_location
+
+        # check outward from king for pins and checks, keep track of pins
+        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+        for j in range(len(directions)):
+            d = directions[j]
+            possible_pin = ()  # reset possible pins
+            for i in range(1, 8):
+                end_row = start_row + d[0] * i
+                end_col = start_col + d[1] * i
+                if 0 <= end_row < 8 and 0 <= end_col < 8:
+                    end_piece = self.board[end_row][end_col]
+                    # the king itself is skipped, so a king location moved for probing sees through it
+                    if end_piece[0] == ally_color and end_piece[1] != 'K':
+                        if possible_pin == ():  # 1st allied piece could be pinned
+                            possible_pin = (end_row, end_col, d[0], d[1])
+                        else:  # 2nd allied piece, so no pin or check possible in this direction
+                            break
+                    elif end_piece[0] == enemy_color:
+                        piece_type = end_piece[1]
+                        # 5 possibilities here in this complex conditional
+                        # 1) orthogonally away from king and piece is a rook
+                        # 2) diagonally away from king and piece is a bishop
+                        # 3) 1 square away diagonally from king and piece is a pawn
+                        # 4) any direction and piece is a queen
+                        # 5) any direction 1 square away and piece is a king
+                        if (0 <= j <= 3 and piece_type == 'R') or (4 <= j <= 7 and piece_type == 'B') or \
+                                (i == 1 and piece_type == 'P' and ((enemy_color == 'w' and 6 <= j <= 7) or (enemy_color == 'b' and 4 <= j <= 5))) or \
+                                (piece_type == 'Q') or (i == 1 and piece_type == 'K'):
+                            if possible_pin == ():  # no piece blocking, so check
+                                in_check = True
+                                checks.append((end_row, end_col, d[0], d[1]))
+                            else:  # piece blocking so pin
+                                pins.append(possible_pin)
+                        break  # enemy piece that is not applying a check also blocks the ray
+                else:  # off board
+                    break
+
+        # check for knight checks
+        knight_moves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+        for m in knight_moves:
+            end_row = start_row + m[0]
+            end_col = start_col + m[1]
+            if 0 <= end_row < 8 and 0 <= end_col < 8:
+                end_piece = self.board[end_row][end_col]
+                if end_piece[0] == enemy_color and end_piece[1] == 'N':  # enemy knight attacking king
+                    in_check = True
+                    checks.append((end_row, end_col, m[0], m[1]))
+        return in_check, pins, checks
+
+    # direction (row, col) in which the piece on (r, c) is pinned, () if it is not pinned
+    def get_pin_direction(self, r, c):
+        for pin in self.pins:
+            if pin[0] == r and pin[1] == c:
+                return pin[2], pin[3]
+        return ()
+
+    # can the pinned (or not pinned) piece move in direction (d_row, d_col)
+    @staticmethod
+    def move_along_pin(pin_direction, d_row, d_col):
+        return pin_direction == () or pin_direction == (d_row, d_col) or pin_direction == (-d_row, -d_col)
+
+    # verifying en passant by hand, two pawns leave the row so it can expose the king on it
+    def enpassant_is_legal(self, r, c, end_row, end_col):
+        pawn = self.board[r][c]
+        captured = self.board[r][end_col]
+        self.board[r][c] = '--'
+        self.board[r][end_col] = '--'
+        self.board[end_row][end_col] = pawn
+        in_check = self.in_check()
+        self.board[r][c] = pawn
+        self.board[r][end_col] = captured
+        self.board[end_row][end_col] = '--'
+        return not in_check
+
+    '''
+    The Move with this move_ID if it is legal in the current position, None if it isn't. For the moves
+    the search remembers from other positions (the hash move and the killers), so they can be tried
+    before any move is generated: the move is checked against the board on its own, then played on
+    the board alone to see that it doesn't leave the king attacked.'''
+    def legal_move_from_ID(self, move_ID):
+        if not move_ID:
+            return None
+        start, end = move_ID & 63, (move_ID >> 6) & 63
+        r, c, end_row, end_col = start >> 3, start & 7, end >> 3, end & 7
+        board = self.board
+        ally_color, enemy_color = ('w', 'b') if self.white_to_move else ('b', 'w')
+        piece = board[r][c]
+        target = board[end_row][end_col]
+        if piece[0] != ally_color or target[0] == ally_color or target[1] == 'K':
+            return None
+        d_row, d_col = end_row - r, end_col - c
+        piece_type = piece[1]
+        if piece_type == 'P':
+            forward = -1 if ally_color == 'w' else 1
+            if d_col == 0:
+                if target != '--' or not (d_row == forward or (d_row == 2 * forward and r == (6 if ally_color == 'w' else 1)
+                                                               and board[r + forward][c] == '--')):
+                    return None
+            elif abs(d_col) != 1 or d_row != forward or (target == '--' and (end_row, end_col) != self.enpassant_possible):
+                return None
+            if move_ID >> 12 and end_row != (0 if ally_color == 'w' else 7):  # a promotion piece on a move that doesn't promote
+                return None
+        elif move_ID >> 12:
+            return None
+        elif piece_type == 'N':
+            if (abs(d_row), abs(d_col)) not in ((1, 2), (2, 1)):
+                return None
+        elif piece_type == 'K':
+            if d_row == 0 and abs(d_col) == 2:
+                if not self.castle_is_legal(r, c, d_col // 2):
+                    return None
+            elif abs(d_row) > 1 or abs(d_col) > 1:
+                return None
+        else:
+            if d_row == 0 or d_col == 0:
+                if piece_type == 'B':
+                    return None
+            elif abs(d_row) != abs(d_col) or piece_type == 'R':
+                return None
+            step_row, step_col = (d_row > 0) - (d_row < 0), (d_col > 0) - (d_col < 0)
+            for i in range(1, max(abs(d_row), abs(d_col))):
+                if board[r + step_row * i][c + step_col * i] != '--':
+                    return None
+
+        move = Move.from_ID(move_ID, board)
+        king_square = (end_row, end_col) if piece_type == 'K' else (self.white_king_location if ally_color == 'w' else self.black_king_location)
+        board[r][c], board[end_row][end_col] = '--', piece
+        if move.is_enpassant_move:
+            board[r][end_col] = '--'
+        legal = not self.is_attacked(king_square, enemy_color)
+        board[r][c], board[end_row][end_col] = piece, target
+        if move.is_enpassant_move:
+            board[r][end_col] = enemy_color + 'P'
+        return move if legal else None
+
+    # can the king on (r, c) castle towards direction (1 kingside, -1 queenside)
+    def castle_is_legal(self, r, c, direction):
+        rights = self.current_castling_right
+        if self.white_to_move:
+            allowed = rights.wks if direction == 1 else rights.wqs
+        else:
+            allowed = rights.bks if direction == 1 else rights.bqs
+        if not allowed or c != 4 or self.in_check():
+            return False
+        for col in (range(5, 7) if direction == 1 else range(1, 4)):
+            if self.board[r][col] != '--':
+                return False
+        return not self.square_under_attack(r, c + direction) and not self.square_under_attack(r, c + 2 * direction)
+
     # determine if the current player is under check
     def in_check(self):
+        if self.bitboards is not None:
+            return self.bitboards.in_check('w' if self.white_to_move else 'b')
+        if self.mailbox is not None:
+            return self.mailbox.in_check('w' if self.white_to_move else 'b')
         if self.white_to_move:
-            return self.square_under_attack(self.white_king_location[0], self.white_king_location[1])
+            return self.is_attacked(self.white_king_location, 'b')
         else:
-            return self.square_under_attack(self.black_king_location[0], self.black_king_location[1])
+            return self.is_attacked(self.black_king_location, 'w')
 
     # if the enemy can attack square (r, c)
     def square_under_attack(self, r, c):
-        self.white_to_move = not self.white_to_move #switch to opponent's
-        oppo_moves = self.get_all_possible_moves()
-        self.white_to_move = not self.white_to_move # to get to original player
-        for move in oppo_moves:
-            if move.end_row == r and move.end_col == c: #square is under attack
+        return self.is_attacked((r, c), 'b' if self.white_to_move else 'w')
+
+    '''
+    Attack queries. Nothing here generates moves, is_attacked() looks outward from the square
+    for each kind of attacker, so it does a bounded amount of work whatever the position.'''
+
+    # is square (row, col) attacked by any piece of color by_color ('w' or 'b')
+    def is_attacked(self, square, by_color):
+        r, c = square
+        board = self.board
+        knight = by_color + 'N'
+        for end_row, end_col in KNIGHT_SQUARES[r][c]:
+            if board[end_row][end_col] == knight:
+                return True
+        king = by_color + 'K'
+        for end_row, end_col in KING_SQUARES[r][c]:
+            if board[end_row][end_col] == king:
+                return True
+        pawn_row = r + 1 if by_color == 'w' else r - 1  # the row an attacking pawn stands on
+        if 0 <= pawn_row < 8:
+            pawn = by_color + 'P'
+            if (c > 0 and board[pawn_row][c-1] == pawn) or (c < 7 and board[pawn_row][c+1] == pawn):
                 return True
+        queen = by_color + 'Q'
+        rook = by_color + 'R'
+        for ray in ORTHOGONAL_RAYS[r][c]:
+            for end_row, end_col in ray:
+                end_piece = board[end_row][end_col]
+                if end_piece != '--':
+                    if end_piece == rook or end_piece == queen:
+                        return True
+                    break
+        bishop = by_color + 'B'
+        for ray in DIAGONAL_RAYS[r][c]:
+            for end_row, end_col in ray:
+                end_piece = board[end_row][end_col]
+                if end_piece != '--':
+                    if end_piece == bishop or end_piece == queen:
+                        return True
+                    break
         return False
 
+    '''
+    8*8 grid counting the pieces of color (w or b) that attack each square, computed once per
+    position and shared by check detection, castling and evaluation. Sliders look through the
+    enemy king, so a king in check can't step back along the checking ray.'''
+    def attack_map(self, color):
+        if color in self.attack_maps:
+            return self.attack_maps[color]
+        board = self.board
+        attacks = [[0] * 8 for _ in range(8)]
+        transparent = ('b' if color == 'w' else 'w') + 'K'
+        pawn_step = -1 if color == 'w' else 1
+        for r in range(8):
+            for c in range(8):
+                piece = board[r][c]
+                if piece[0] != color:
+                    continue
+                piece_type = piece[1]
+                if piece_type == 'P':
+                    if 0 <= r + pawn_step < 8:
+                        if c > 0:
+                            attacks[r + pawn_step][c-1] += 1
+                        if c < 7:
+                            attacks[r + pawn_step][c+1] += 1
+                elif piece_type == 'N' or piece_type == 'K':
+                    for end_row, end_col in (KNIGHT_SQUARES if piece_type == 'N' else KING_SQUARES)[r][c]:
+                        attacks[end_row][end_col] += 1
+                else:
+                    rays = []
+                    if piece_type != 'B':
+                        rays += ORTHOGONAL_RAYS[r][c]
+                    if piece_type != 'R':
+                        rays += DIAGONAL_RAYS[r][c]
+                    for ray in rays:
+                        for end_row, end_col in ray:
+                            attacks[end_row][end_col] += 1
+                            end_piece = board[end_row][end_col]
+                            if end_piece != '--' and end_piece != transparent:
+                                break
+        self.attack_maps[color] = attacks
+        return attacks
+
     #generating all possible moves
     def get_all_possible_moves(self):
         moves = []
@@ -233,68 +895,62 @@ class GameState:
 
     # get all the pawn moves and add these moves to the list
     def get_pawn_moves(self, r, c, moves):
+        pin_direction = self.get_pin_direction(r, c)
+        advances = not self.captures_only or r == (1 if self.white_to_move else 6)  # promotions count as captures
+
         if self.white_to_move:  # white pawn moves
-            if self.board[r-1][c] == '--':  # 1 square pawn advance
-                moves.append(Move((r, c), (r-1, c), self.board))
+            if advances and self.board[r-1][c] == '--' and self.move_along_pin(pin_direction, -1, 0):  # 1 square pawn advance
+                self.add_pawn_move((r, c), (r-1, c), moves)
                 if r == 6 and self.board[r-2][c] == '--':  # 2 square pawn advance
                     moves.append(Move((r, c), (r-2, c), self.board))
 
-            if c-1 >= 0:  # captures to the left
+            if c-1 >= 0 and self.move_along_pin(pin_direction, -1, -1):  # captures to the left
                 if self.board[r-1][c-1][0] == 'b':  # enemy piece to capture
-                    moves.append(Move((r, c), (r-1, c-1), self.board))
-                elif (r-1, c-1) == self.enpassant_possible:
+                    self.add_pawn_move((r, c), (r-1, c-1), moves)
+                elif (r-1, c-1) == self.enpassant_possible and self.enpassant_is_legal(r, c, r-1, c-1):
                     moves.append(Move((r, c), (r-1, c-1), self.board, is_enpassant_move=True))
 
-            if c+1 <= 7:  # capture to the right
+            if c+1 <= 7 and self.move_along_pin(pin_direction, -1, 1):  # capture to the right
                 if self.board[r-1][c+1][0] == 'b':
-                    moves.append(Move((r, c), (r-1, c+1), self.board))
-                elif (r-1, c+1) == self.enpassant_possible:
+                    self.add_pawn_move((r, c), (r-1, c+1), moves)
+                elif (r-1, c+1) == self.enpassant_possible and self.enpassant_is_legal(r, c, r-1, c+1):
                     moves.append(Move((r, c), (r-1, c+1), self.board, is_enpassant_move=True))
 
         else:  # black pawn moves
-            if self.board[r+1][c] == '--':  # 1 square pawn move
-                moves.append(Move((r, c), (r+1, c), self.board))
+            if advances and self.board[r+1][c] == '--' and self.move_along_pin(pin_direction, 1, 0):  # 1 square pawn move
+                self.add_pawn_move((r, c), (r+1, c), moves)
                 if r == 1 and self.board[r+2][c] == '--':  # 2 square pawn move
                     moves.append(Move((r, c), (r+2, c), self.board))
 
-            if c-1 >= 0:  # captures to the right
+            if c-1 >= 0 and self.move_along_pin(pin_direction, 1, -1):  # captures to the right
                 if self.board[r+1][c-1][0] == 'w':  # enemy piece to capture
-                    moves.append(Move((r, c), (r+1, c-1), self.board))
-                elif (r+1, c-1) == self.enpassant_possible:
+                    self.add_pawn_move((r, c), (r+1, c-1), moves)
+                elif (r+1, c-1) == self.enpassant_possible and self.enpassant_is_legal(r, c, r+1, c-1):
                     moves.append(Move((r, c), (r+1, c-1), self.board, is_enpassant_move=True))
 
-            if c+1 <= 7:  # capture to the left
+            if c+1 <= 7 and self.move_along_pin(pin_direction, 1, 1):  # capture to the left
                 if self.board[r+1][c+1][0] == 'w':
-                    moves.append(Move((r, c), (r+1, c+1), self.board))
-                elif (r+1, c+1) == self.enpassant_possible:
+                    self.add_pawn_move((r, c), (r+1, c+1), moves)
+                elif (r+1, c+1) == self.enpassant_possible and self.enpassant_is_legal(r, c, r+1, c+1):
                     moves.append(Move((r, c), (r+1, c+1), self.board, is_enpassant_move=True))
 
+    # a pawn move onto the last rank is four moves, one for each piece it can promote to
+    def add_pawn_move(self, start_sq, end_sq, moves):
+        if end_sq[0] == 0 or end_sq[0] == 7:
+            for piece in Move.PROMOTION_PIECES:
+                moves.append(Move(start_sq, end_sq, self.board, promotion_piece=piece))
+        else:
+            moves.append(Move(start_sq, end_sq, self.board))
 
     # get all the rook moves and add these moves to the list
     def get_rook_moves(self, r, c, moves):
         directions = ((-1, 0), (0, -1), (1, 0), (0, 1))  # up left down right
-        enemy_color = 'b' if self.white_to_move else 'w'
-
-        for d in directions:
-            for i in range(1, 8):
-                end_row = r + d[0] * i
-                end_col = c + d[1] * i
-
-                if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    end_piece = self.board[end_row][end_col]
-
-                    if end_piece == '--':
-                        moves.append(Move((r, c), (end_row, end_col), self.board))
-                    elif end_piece[0] == enemy_color:
-                        moves.append(Move((r, c), (end_row, end_col), self.board))
-                        break
-                    else:  # for friendly piece
-                        break
-                else:  # off board
-                    break
+        self.get_sliding_moves(r, c, moves, directions)
 
     # get all the knight moves and add these moves to the list
     def get_knight_moves(self, r, c, moves):
+        if self.get_pin_direction(r, c) != ():  # a pinned knight can never move
+            return
         knight_moves = ((-2,-1),(-2,1),(-1,-2),(-1,2),(1,-2),(1,2),(2,-1),(2,1))
         ally_color = 'w' if self.white_to_move else 'b'
         for m in knight_moves:
@@ -302,15 +958,22 @@ class GameState:
             end_col = c + m[1]
             if 0 <= end_row < 8 and 0 <= end_col < 8:
                 end_piece = self.board[end_row][end_col]
-                if end_piece[0] != ally_color:  # i.e empty or enemy
+                if end_piece[0] != ally_color and not (self.captures_only and end_piece == '--'):  # i.e empty or enemy
                     moves.append(Move((r, c), (end_row, end_col), self.board))
 
     # get all the bishop moves and add these moves to the list
     def get_bishop_moves(self, r, c, moves):
         directions = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+        self.get_sliding_moves(r, c, moves, directions)
+
+    # rook and bishop moves, a pinned piece only slides along the pin
+    def get_sliding_moves(self, r, c, moves, directions):
+        pin_direction = self.get_pin_direction(r, c)
         enemy_color = 'b' if self.white_to_move else 'w'
 
         for d in directions:
+            if not self.move_along_pin(pin_direction, d[0], d[1]):
+                continue
             for i in range(1, 8):  # can move max 7 squares
                 end_row = r + d[0] * i
                 end_col = c + d[1] * i
@@ -319,7 +982,8 @@ class GameState:
                     end_piece = self.board[end_row][end_col]
 
                     if end_piece == '--':
-                        moves.append(Move((r, c), (end_row, end_col), self.board))
+                        if not self.captures_only:
+                            moves.append(Move((r, c), (end_row, end_col), self.board))
                     elif end_piece[0] == enemy_color:
                         moves.append(Move((r, c), (end_row, end_col), self.board))
                         break
@@ -335,22 +999,20 @@ class GameState:
 
     # get all the king moves and add these moves to the list
     def get_king_moves(self, r, c, moves):
-        king_moves = ((-1,-1),(-1,0),(-1,1),(0,-1),(0,1),(1,-1),(1,0),(1,1))
         allycolor = 'w' if self.white_to_move else 'b'
-        for i in range(8):
-            end_row = r + king_moves[i][0]
-            end_col = c + king_moves[i][1]
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] != allycolor:
-                    moves.append(Move((r, c), (end_row, end_col), self.board))
-                elif end_piece == '--':
+        enemy_attacks = None
+        for end_row, end_col in KING_SQUARES[r][c]:
+            end_piece = self.board[end_row][end_col]
+            if end_piece[0] != allycolor and not (self.captures_only and end_piece == '--'):
+                if enemy_attacks is None:  # only build the attack map if the king can go somewhere
+                    enemy_attacks = self.attack_map('b' if self.white_to_move else 'w')
+                if not enemy_attacks[end_row][end_col]:  # the king must not step onto an attacked square
                     moves.append(Move((r, c), (end_row, end_col), self.board))
 
 
     # generate all valid castle moves for king and add them to the list of moves
     def get_castle_moves(self, r, c, moves):
-        if self.square_under_attack(r, c):
+        if self.attack_map('b' if self.white_to_move else 'w')[r][c]:
             return  # we can't castle while in check
         if (self.white_to_move and self.current_castling_right.wks) or (not self.white_to_move and self.current_castling_right.bks):
             self.get_kingside_castle_moves(r, c, moves)
@@ -359,13 +1021,15 @@ class GameState:
 
 
     def get_kingside_castle_moves(self, r, c, moves):
+        enemy_attacks = self.attack_map('b' if self.white_to_move else 'w')
         if self.board[r][c+1] == '--' and self.board[r][c+2] == '--':
-            if not self.square_under_attack(r, c+1) and not self.square_under_attack(r, c+2):
+            if not enemy_attacks[r][c+1] and not enemy_attacks[r][c+2]:
                 moves.append(Move((r, c), (r, c+2), self.board, is_castle_move=True))
 
     def get_queenside_castle_moves(self, r, c, moves):
+        enemy_attacks = self.attack_map('b' if self.white_to_move else 'w')
         if self.board[r][c-1] == '--' and self.board[r][c-2] == '--' and self.board[r][c-3] == '--':
-            if not self.square_under_attack(r, c-1) and not self.square_under_attack(r, c-2):
+            if not enemy_attacks[r][c-1] and not enemy_attacks[r][c-2]:
                 moves.append(Move((r, c), (r, c-2), self.board, is_castle_move=True))
 
 
@@ -377,6 +1041,15 @@ class CastlingRights:
         self.bqs = bqs
 
 class Move:
+    '''
+    move_ID packs the move into a 14-bit int: the start square (8*row + col) in bits 0-5, the end
+    square in bits 6-11 and the promotion piece (index in PROMOTION_PIECES) in bits 12-13. The search
+    keeps just that int in the transposition table, killers and history, and from_ID() builds the
+    Move back from it when it is needed. __slots__ keeps the many Move objects the generators make
+    small: a handful of fixed fields instead of a dict each.'''
+    __slots__ = ('start_row', 'start_col', 'end_row', 'end_col', 'piece_moved', 'piece_captured',
+                 'is_enpassant_move', 'is_pawn_promotion', 'promotion_piece', 'is_castle_move', 'move_ID')
+
     # map keys to values to make chess notation work in computer
     ranks_to_rows = {'1': 7, '2': 6, '3': 5, '4': 4, '5': 3, '6': 2, '7': 1, '8': 0}
     rows_to_ranks = {k: v for v, k in ranks_to_rows.items()}
@@ -384,13 +1057,11 @@ class Move:
     files_to_cols = {'a': 0, 'b': 1, 'c': 2, 'd': 3, 'e': 4, 'f': 5, 'g': 6, 'h': 7}
     cols_to_files = {k: v for v, k in files_to_cols.items()}
 
-    def __init__(self, start_sq, end_sq, board, is_enpassant_move=False, is_castle_move=False):  # optional parameters
-        self.start_sq = start_sq
-        self.end_sq = end_sq
-        self.start_row = start_sq[0]
-        self.start_col = start_sq[1]
-        self.end_row = end_sq[0]
-        self.end_col = end_sq[1]
+    PROMOTION_PIECES = ('Q', 'R', 'B', 'N')
+
+    def __init__(self, start_sq, end_sq, board, is_enpassant_move=False, is_castle_move=False, promotion_piece='Q'):  # optional parameters
+        self.start_row, self.start_col = start_sq
+        self.end_row, self.end_col = end_sq
         self.piece_moved = board[self.start_row][self.start_col]
         self.piece_captured = board[self.end_row][self.end_col]
 
@@ -399,15 +1070,34 @@ class Move:
         if self.is_enpassant_move:
             self.piece_captured = 'wP' if self.piece_moved == 'bP' else 'bP'
 
-        # pawn promotion
-        self.is_pawn_promotion = False
-        if (self.piece_moved == 'wP' and self.end_row == 0) or (self.piece_moved == 'bP' and self.end_row == 7):
-            self.is_pawn_promotion = True
+        # pawn promotion, to a queen unless another piece is asked for
+        self.is_pawn_promotion = (self.piece_moved == 'wP' and self.end_row == 0) or (self.piece_moved == 'bP' and self.end_row == 7)
+        self.promotion_piece = promotion_piece if self.is_pawn_promotion else None
 
         # castle move
         self.is_castle_move = is_castle_move
 
-        self.move_ID = 1000*self.start_row + 100*self.start_col + 10*self.end_row + self.end_col
+        self.move_ID = 8*self.start_row + self.start_col | (8*self.end_row + self.end_col) << 6
+        if self.is_pawn_promotion:
+            self.move_ID |= self.PROMOTION_PIECES.index(promotion_piece) << 12
+
+    # the Move with this move_ID in the position on board, en passant and castling read off the board
+    @classmethod
+    def from_ID(cls, move_ID, board):
+        start, end = move_ID & 63, (move_ID >> 6) & 63
+        start_sq, end_sq = (start >> 3, start & 7), (end >> 3, end & 7)
+        piece = board[start_sq[0]][start_sq[1]]
+        is_enpassant_move = piece[1] == 'P' and start_sq[1] != end_sq[1] and board[end_sq[0]][end_sq[1]] == '--'
+        is_castle_move = piece[1] == 'K' and abs(start_sq[1] - end_sq[1]) == 2
+        return cls(start_sq, end_sq, board, is_enpassant_move, is_castle_move, cls.PROMOTION_PIECES[move_ID >> 12])
+
+    @property
+    def start_sq(self):
+        return self.start_row, self.start_col
+
+    @property
+    def end_sq(self):
+        return self.end_row, self.end_col
 
     # overriding the equals method
     # although the column is same it considers it as two diff objects
@@ -417,12 +1107,14 @@ class Move:
         return False
 
     def get_chess_notation(self):
-        return self.get_rank_file(self.start_row, self.start_col) + self.get_rank_file(self.end_row, self.end_col)
+        notation = self.get_rank_file(self.start_row, self.start_col) + self.get_rank_file(self.end_row, self.end_col)
+        return notation + self.promotion_piece.lower() if self.is_pawn_promotion else notation
 
     def get_rank_file(self, r, c):
         return self.cols_to_files[c] + self.rows_to_ranks[r]
 
-    # overridng the str() function
+    # the move in algebraic notation as far as the move alone tells, without the disambiguation and the
+    # check marks of full SAN, which need the position (GameState.get_san)
     def __str__(self):
         # castle move
         if self.is_castle_move:
@@ -430,4 +1122,9 @@ class Move:
             # 'O-O-O' queen side castle
             return 'O-O' if self.end_col == 6 else 'O-O-O'
 
-        #end_square = self.get_rank_file(self.end_row, self.end_col)
+        end_square = self.get_rank_file(self.end_row, self.end_col)
+        capture = 'x' if self.piece_captured != '--' else ''
+        if self.piece_moved[1] == 'P':
+            notation = (self.cols_to_files[self.start_col] + capture if capture else '') + end_square
+            return notation + '=' + self.promotion_piece if self.is_pawn_promotion else notation
+        return self.piece_moved[1] + capture + end_square
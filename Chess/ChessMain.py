@@ -3,8 +3,12 @@ It will be responsible for handling user input and displaying the current
 GameState object
 '''
 
+import queue
+import time
 import pygame as p
+from multiprocessing import Event, Process, Queue
 from Chess import ChessEngine, Chess_AI
+from Chess.transposition import SharedTranspositionTable
 
 BOARD_WIDTH = BOARD_HEIGHT = 512
 MOVE_LOG_PANEL_WIDTH = 250
@@ -12,6 +16,9 @@ MOVE_LOG_PANEL_HEIGHT = BOARD_HEIGHT
 DIMENSION = 8
 SQ_SIZE = BOARD_HEIGHT // DIMENSION
 MAX_FPS = 15  # will be used for animation
+USE_BITBOARDS = True  # generate moves with the bitboard backend instead of scanning the 8*8 list
+PONDER = True  # keep searching the expected reply while the human thinks
+RESULT_TIMEOUT = 0.1  # seconds to wait for the move of a search process that has ended
 IMAGES = {}
 
 def load_images():
@@ -28,7 +35,7 @@ def main():
     screen.fill(p.Color('white'))
     move_log_font = p.font.SysFont('Ariel', 15 , False, False)
 
-    gs = ChessEngine.GameState()
+    gs = ChessEngine.GameState(bitboard=USE_BITBOARDS)
     valid_moves = gs.get_valid_moves()
     move_made = False  # flag variable for when a move is made
     animate = False
@@ -40,11 +47,29 @@ def main():
     game_over = False
     player_one = True  # if a human is playing white, then this will be true. if AI is playing then False
     player_two = False  # same as above but for black
+    ai_thinking = False  # the AI is searching in move_finder_process
+    move_finder_process = None
+    return_queue = None
+    search_stop = None  # stop event of a search adopted from pondering, set at stop_time
+    stop_time = 0
+    pondering = False  # the AI is searching ponder_move_ID's position in ponder_process
+    ponder_process = None
+    ponder_queue = None
+    ponder_stop = None
+    ponder_move_ID = 0
+    ponder_start = 0
+    reply_ID = 0  # reply the AI expects to its last move, pondered once the move is on the board
+    # every search process attaches to this table, so what one search learnt is there for the next
+    table = SharedTranspositionTable(Chess_AI.TT_SIZE_MB)
     while running:
         human_turn = (gs.white_to_move and player_one) or (not gs.white_to_move and player_two)
         for e in p.event.get():
             if e.type == p.QUIT:
                 running = False
+                if ai_thinking:
+                    move_finder_process.kill()
+                if pondering:
+                    ponder_process.kill()
             # mouse handler
             elif e.type == p.MOUSEBUTTONDOWN:
                 if not game_over and human_turn:
@@ -60,7 +85,7 @@ def main():
                         player_click.append(sq_select)  # append for both clicks
 
                     if len(player_click) == 2:
-                        move = ChessEngine.Move(player_click[0], player_click[1], gs.board)
+                        move = ChessEngine.Move(player_click[0], player_click[1], gs.board)  # promotes to a queen
                         print(move.get_chess_notation())
                         for i in range(len(valid_moves)):
                             if move == valid_moves[i]:
@@ -76,6 +101,12 @@ def main():
             # key handlers
             elif e.type == p.KEYDOWN:
                 if e.key == p.K_z:  # undo when 'z' is pressed
+                    if ai_thinking:  # the search was for the position being undone
+                        move_finder_process.kill()
+                        ai_thinking = False
+                    if pondering:
+                        ponder_process.kill()
+                        pondering = False
                     gs.undo_move()
                     valid_moves = gs.get_valid_moves()
                     move_made = True
@@ -83,7 +114,13 @@ def main():
                     game_over = False
 
                 if e.key == p.K_r :  # reset the board when r is pressed
-                    gs = ChessEngine.GameState()
+                    if ai_thinking:
+                        move_finder_process.kill()
+                        ai_thinking = False
+                    if pondering:
+                        ponder_process.kill()
+                        pondering = False
+                    gs = ChessEngine.GameState(bitboard=USE_BITBOARDS)
                     valid_moves = gs.get_valid_moves()
                     sq_select = ()
                     player_click = []
@@ -91,14 +128,41 @@ def main():
                     animate = False
                     game_over = False
 
-        # AI move finder
-        if not game_over and not human_turn:
-            AI_move = Chess_AI.find_best_move(gs, valid_moves)
-            if AI_move is None:
-                AI_move = Chess_AI.find_random_move(valid_moves)
-            gs.make_move(AI_move)
-            move_made = True
-            animate = True
+        # the human moved while the AI pondered
+        if pondering and move_made:
+            pondering = False
+            if gs.move_log[-1].move_ID == ponder_move_ID:
+                # the expected move, the ponder search becomes the AI's search and answers once it
+                # has had the usual search time, straight away if the human took longer than that
+                ai_thinking = True
+                move_finder_process, return_queue, search_stop = ponder_process, ponder_queue, ponder_stop
+                stop_time = ponder_start + Chess_AI.MOVE_TIME
+            else:  # another move, the AI searches it from scratch but with the table warmed up
+                ponder_stop.set()
+                ponder_process.join()
+
+        # AI move finder, searches a copy of gs in another process so the window keeps responding.
+        # waits for valid_moves to catch up with a move just made, and for a new game after a reset
+        human_turn = (gs.white_to_move and player_one) or (not gs.white_to_move and player_two)
+        if not game_over and not human_turn and not move_made:
+            if not ai_thinking:
+                ai_thinking = True
+                move_finder_process, return_queue = start_search(gs, valid_moves, table.name)
+                search_stop = None
+            elif not move_finder_process.is_alive():
+                try:
+                    move_ID, reply_ID = return_queue.get(timeout=RESULT_TIMEOUT)
+                except queue.Empty:  # the search process died without a move, play a random one
+                    move_ID, reply_ID = 0, 0
+                AI_move = Chess_AI.find_move_by_ID(valid_moves, move_ID)
+                if AI_move is None:
+                    AI_move = Chess_AI.find_random_move(valid_moves)
+                gs.make_move(AI_move)
+                move_made = True
+                animate = True
+                ai_thinking = False
+            elif search_stop is not None and time.time() >= stop_time:
+                search_stop.set()
 
         if move_made:
             if animate:
@@ -107,7 +171,26 @@ def main():
             move_made = False
             animate = False
 
+            # ponder on the human's time, searching the position after the reply the AI expects
+            human_turn = (gs.white_to_move and player_one) or (not gs.white_to_move and player_two)
+            reply = Chess_AI.find_move_by_ID(valid_moves, reply_ID) if reply_ID else None
+            reply_ID = 0
+            if PONDER and human_turn and reply is not None and not pondering and not gs.is_draw():
+                gs.make_move(reply)
+                ponder_moves = gs.get_valid_moves()
+                # not when the reply ends the game, the adopted search would have no move to play
+                if len(ponder_moves) > 0 and not gs.is_draw():
+                    ponder_stop = Event()
+                    ponder_process, ponder_queue = start_search(gs, ponder_moves, table.name, ponder_stop)
+                    pondering = True
+                    ponder_move_ID = reply.move_ID
+                    ponder_start = time.time()
+                gs.undo_move()
+                valid_moves = gs.get_valid_moves()
+
         draw_game_state(screen, gs, valid_moves, sq_select, move_log_font)
+        if ai_thinking:
+            draw_thinking_text(screen, move_log_font)
 
         if gs.checkmate:
             game_over = True
@@ -118,10 +201,27 @@ def main():
         elif gs.stalemate:
             game_over = True
             draw_end_game_text(screen, 'Stalemate!')
+        elif gs.repetition_count() >= 3:
+            game_over = True
+            draw_end_game_text(screen, 'Draw by threefold repetition')
+        elif gs.is_fifty_move_draw():
+            game_over = True
+            draw_end_game_text(screen, 'Draw by the fifty-move rule')
 
         clock.tick(MAX_FPS)
         p.display.flip()
 
+    table.close()
+
+# runs Chess_AI.find_best_move_for_queue in a new process on a copy of gs, returns the process and the
+# queue the move comes back through. The process is stopped with kill(), it inherits pygame's SIGTERM
+# handler so terminate() doesn't stop it.
+def start_search(gs, valid_moves, table_name, stop=None):
+    return_queue = Queue()
+    process = Process(target=Chess_AI.find_best_move_for_queue, args=(gs, valid_moves, return_queue, table_name, stop), daemon=True)
+    process.start()
+    return process, return_queue
+
 # Responsible for all the graphics within a current game state
 def draw_game_state(screen, gs, valid_moves, sq_selected, move_log_font):
     draw_board(screen)  # draw squares on board
@@ -220,6 +320,13 @@ def animated_move(move, screen, board, clock):
         p.display.flip()
         clock.tick(200) # frame rate per animation
 
+# shown in the bottom of the move log panel while the AI searches, the dots keep moving
+def draw_thinking_text(screen, font):
+    dots = (p.time.get_ticks() // 400) % 4
+    text_object = font.render('Thinking' + '.' * dots, True, p.Color('chartreuse1'))
+    padding = 5
+    screen.blit(text_object, (BOARD_WIDTH + padding, MOVE_LOG_PANEL_HEIGHT - text_object.get_height() - padding))
+
 def draw_end_game_text(screen, text):
     font = p.font.SysFont('Helvitca', 32, True, False)  # bold, italicized
     text_object = font.render(text, 0, p.Color('Gray '))
@@ -1,16 +1,651 @@
+import atexit
+import multiprocessing
 import random
+import time
+from Chess import evaluation
+from Chess.evaluation import piece_score
+from Chess.transposition import TranspositionTable, SharedTranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
 
-piece_score = {'K': 0, 'Q': 10, 'R': 5, 'B': 3, 'N': 3, 'P': 1}
-CHECKMATE = 1000
+CHECKMATE = 100000  # above any evaluation, which is in centipawns
+# a side mated ply plies from the root scores -(CHECKMATE - ply), so a nearer mate scores higher.
+# Any score beyond MATE_THRESHOLD is a mate
+MATE_THRESHOLD = CHECKMATE - 1000
 STALEMATE = 0
+DRAW = 0  # repetition or fifty-move rule
 DEPTH = 4
+MAX_DEPTH = 64  # iterative deepening stops here even if there is time left
+MOVE_TIME = 2.0  # seconds per move when find_best_move isn't given a clock
+TT_SIZE_MB = 16  # memory budget of the transposition table
+DELTA_MARGIN = 200  # quiescence skips captures that can't lift the score to alpha even with this much extra
+
+# selective search, each part can be switched off on its own, python -m Chess.search_benchmark shows what each is worth
+USE_PVS = True  # principal variation search, the moves after the first get a null window
+USE_NULL_MOVE = True  # null-move pruning
+USE_LMR = True  # late move reductions
+USE_ASPIRATION = True  # aspiration windows at the root
+NULL_MOVE_REDUCTION = 2  # the null move is searched this many plies shallower
+LMR_MIN_DEPTH = 3  # no reductions closer to the leaves than this
+LMR_FULL_MOVES = 3  # moves of a node searched at full depth before the later quiet ones get reduced
+LMR_LATE_MOVES = 8  # from this move on quiet moves are reduced by two plies
+LMR_HISTORY = 256  # a quiet move with a history score above this is reduced by one ply less
+ASPIRATION_WINDOW = 50  # the root window is the previous iteration's score plus or minus this
+
+# shared by every search so positions from earlier moves can still help
+transposition_table = TranspositionTable(TT_SIZE_MB)
+shared_table = None  # the shared memory table of find_best_move_smp, made on its first search
+opening_book = None  # a book.OpeningBook the find_best_move* functions play from before searching, none by default
+
+# move ordering, a hash move goes before every capture, every capture before every promotion and so on
+HASH_MOVE_SCORE = 1000000000
+CAPTURE_SCORE = 100000000
+PROMOTION_SCORE = 90000000
+KILLER_SCORE = 80000000
+# [gs.white_to_move][move_ID], grows when a quiet move causes a beta cutoff. Shared by every search like
+# the transposition table, it only steers move ordering so searches running side by side can share it
+history_scores = [[0] * (1 << 14), [0] * (1 << 14)]
+
+
+# raised inside the search when the time or node budget runs out
+class SearchTimeout(Exception):
+    pass
+
+
+class SearchStats:
+    '''
+    What a search did, every find_best_move* function returns one next to the move. best_move, score
+    and depth are those of the deepest iteration that finished. iterations holds a
+    (depth, score, nodes, seconds, principal variation) tuple per finished iteration, nodes and
+    seconds being that iteration's own (quiescence nodes included).'''
+    def __init__(self):
+        self.best_move = None
+        self.score = None
+        self.depth = 0
+        self.sel_depth = 0  # deepest ply any line reached, quiescence included
+        self.nodes = 0  # nodes of the main search
+        self.q_nodes = 0  # nodes of the quiescence search
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.expanded_nodes = 0  # nodes of the main search that went through their moves
+        self.cutoffs = 0  # expanded nodes a move cut off
+        self.first_move_cutoffs = 0  # cutoffs by the first move searched
+        self.iterations = []
+        self.start_time = time.perf_counter()
+        self.elapsed = 0.0  # seconds, as of the last finished iteration or the end of the search
+        self.from_book = False  # best_move came from the opening book, nothing was searched
+
+    @property
+    def total_nodes(self):
+        return self.nodes + self.q_nodes
+
+    @property
+    def nps(self):
+        return self.total_nodes / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def tt_hit_rate(self):
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    # share of the expanded nodes that cut off, and share of the cutoffs the first move made
+    @property
+    def cutoff_rate(self):
+        return self.cutoffs / self.expanded_nodes if self.expanded_nodes else 0.0
+
+    @property
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    # effective branching factor, how many times more nodes the last iteration took than the one before
+    @property
+    def branching_factor(self):
+        if len(self.iterations) < 2 or not self.iterations[-2][2]:
+            return 0.0
+        return self.iterations[-1][2] / self.iterations[-2][2]
+
+    # adds up the counts of another search of the same position, a helper of find_best_move_smp or a parallel task
+    def merge(self, other):
+        self.nodes += other.nodes
+        self.q_nodes += other.q_nodes
+        self.tt_probes += other.tt_probes
+        self.tt_hits += other.tt_hits
+        self.expanded_nodes += other.expanded_nodes
+        self.cutoffs += other.cutoffs
+        self.first_move_cutoffs += other.first_move_cutoffs
+        self.sel_depth = max(self.sel_depth, other.sel_depth)
+
+    def __str__(self):
+        if self.from_book:
+            return 'book move %s' % self.best_move.get_chess_notation()
+        return ('depth %d seldepth %d score %s nodes %d (%d quiescence) nps %d time %.2fs tt hits %.0f%% '
+                'cutoffs %.0f%% first move %.0f%% branching %.1f move %s' %
+                (self.depth, self.sel_depth, self.score, self.total_nodes, self.q_nodes, self.nps, self.elapsed,
+                 100 * self.tt_hit_rate, 100 * self.cutoff_rate, 100 * self.first_move_cutoff_rate,
+                 self.branching_factor, self.best_move.get_chess_notation() if self.best_move is not None else None))
+
+
+# callback of a search that prints every finished iteration
+def print_progress(stats):
+    depth, score, nodes, seconds, pv = stats.iterations[-1]
+    print('depth', depth, 'seldepth', stats.sel_depth, 'score', score, 'nodes', stats.total_nodes, 'nps', int(stats.nps),
+          'time %.2fs' % stats.elapsed, 'pv', ' '.join(move.get_chess_notation() for move in pv))
 
 # picks and return a random move
 def find_random_move(valid_moves):
     return valid_moves[random.randint(0, len(valid_moves)-1)]
 
-# find the best move based on material alone
-def find_best_move(gs, valid_moves):
+'''
+Iterative deepening with time control: search depth 1, 2, 3... and return the best move of the
+last depth that finished, with the SearchStats of the search. The budget is move_time seconds if
+given, otherwise a share of the remaining clock plus most of the increment; max_nodes caps the nodes
+as well. When the budget runs out mid-iteration the search unwinds, the moves it made are undone and
+that iteration is thrown away. Every iteration searches the previous best move first at the root,
+and the best moves stored in the transposition table first everywhere else, so the previous principal
+variation is searched first and the deeper iterations cut off sooner. callback(stats) is called after
+every finished iteration, and setting stop_event (a threading or multiprocessing Event) ends the search
+like the budget running out. With use_book and a position in opening_book the book move is played
+without searching, stats.from_book says so.'''
+def find_best_move(gs, valid_moves, move_time=None, remaining_time=None, increment=0.0, max_nodes=None, max_depth=MAX_DEPTH,
+                   callback=None, table=None, stop_event=None, use_book=True):
+    if len(valid_moves) == 0:
+        return None, SearchStats()
+    if use_book:
+        move, stats = book_move(gs, valid_moves)
+        if move is not None:
+            return move, stats
+    search = Search(table, search_deadline(move_time, remaining_time, increment), max_nodes, stop_event, callback)
+    search.table.new_search()
+    new_move_ordering()
+    best_move, depth, score = search.iterative_deepening(gs, valid_moves, 1, max_depth)
+    gs.get_valid_moves()  # the unwinding may have left the checkmate/stalemate flags of another position
+    return best_move if best_move is not None else valid_moves[0], search.stats
+
+'''
+find_best_move for a separate process, (move_ID of the move, move_ID of the reply it expects) goes back
+through return_queue. With table_name the search uses that SharedTranspositionTable, so the table
+outlives the process. With stop, a multiprocessing.Event, there is no time limit and the search goes
+on until the event is set, which is how the GUI ponders on the opponent's time. Every iteration is
+printed (print_progress), the GUI's console shows what the search is doing.'''
+def find_best_move_for_queue(gs, valid_moves, return_queue, table_name=None, stop=None):
+    table = SharedTranspositionTable(TT_SIZE_MB, table_name) if table_name is not None else transposition_table
+    best_move, stats = find_best_move(gs, valid_moves, move_time=float('inf') if stop is not None else None,
+                                      callback=print_progress, table=table, stop_event=stop)
+    reply = expected_reply(gs, best_move, table) if best_move is not None else None
+    return_queue.put((best_move.move_ID if best_move is not None else 0, reply.move_ID if reply is not None else 0))
+
+# a move of opening_book for gs picked by weight, with its SearchStats, (None, None) when gs isn't in the book
+def book_move(gs, valid_moves):
+    if opening_book is None:
+        return None, None
+    move = opening_book.choose_move(gs, valid_moves)
+    if move is None:
+        return None, None
+    stats = SearchStats()
+    stats.best_move = move
+    stats.from_book = True
+    stats.elapsed = time.perf_counter() - stats.start_time
+    return move, stats
+
+# the best reply to move stored in the transposition table, None if there is none
+def expected_reply(gs, move, table=None):
+    table = table if table is not None else transposition_table
+    gs.make_move(move)
+    entry = table.probe(gs.hash_key)
+    reply = find_move_by_ID(gs.get_valid_moves(), entry[3]) if entry is not None and entry[3] else None
+    gs.undo_move()
+    return reply
+
+# time.perf_counter() value a search given this budget has to stop at
+def search_deadline(move_time=None, remaining_time=None, increment=0.0):
+    if move_time is None:
+        move_time = MOVE_TIME if remaining_time is None else allocate_time(remaining_time, increment)
+    return time.perf_counter() + move_time
+
+'''
+Lazy SMP: workers - 1 helper processes search the same position as this one, all sharing one
+transposition table in shared memory. Nothing else is shared, the helpers just fill the table with
+entries this process then finds ready, so it gets to each depth sooner. Helpers start at staggered
+depths and with their own random root move order so they don't all search the same tree at the same
+time. The best move is the one of the deepest iteration any process finished, this process's on a tie.
+The SearchStats counts the nodes of every process, stop_event and use_book work like in find_best_move.'''
+def find_best_move_smp(gs, valid_moves, workers=2, move_time=None, remaining_time=None, increment=0.0,
+                       max_nodes=None, max_depth=MAX_DEPTH, callback=None, stop_event=None, use_book=True):
+    global shared_table
+    if len(valid_moves) == 0:
+        return None, SearchStats()
+    if use_book:
+        move, stats = book_move(gs, valid_moves)
+        if move is not None:
+            return move, stats
+    if shared_table is None:
+        shared_table = SharedTranspositionTable(TT_SIZE_MB)
+        atexit.register(shared_table.close)
+    shared_table.new_search()
+    new_move_ordering()
+
+    stop = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    helpers = [multiprocessing.Process(target=_smp_helper, daemon=True,
+                                       args=(gs, list(valid_moves), shared_table.name, shared_table.age, i, stop, results, max_depth))
+               for i in range(1, workers)]
+    for helper in helpers:
+        helper.start()
+    search = Search(shared_table, search_deadline(move_time, remaining_time, increment), max_nodes, stop_event, callback)
+    best_move, best_depth, score = search.iterative_deepening(gs, valid_moves, 1, max_depth)
+    stats = search.stats
+    stop.set()
+    for helper in helpers:
+        depth, move_ID, helper_score, helper_stats = results.get()
+        stats.merge(helper_stats)
+        if depth > best_depth and move_ID:
+            best_move, best_depth, score = find_move_by_ID(valid_moves, move_ID), depth, helper_score
+    for helper in helpers:
+        helper.join()
+    stats.best_move, stats.depth, stats.score = best_move, best_depth, score
+    stats.elapsed = time.perf_counter() - stats.start_time
+    gs.get_valid_moves()
+    return best_move if best_move is not None else valid_moves[0], stats
+
+# runs in a helper process of find_best_move_smp until the stop event is set
+def _smp_helper(gs, valid_moves, table_name, age, helper, stop, results, max_depth):
+    random.seed(helper)
+    table = SharedTranspositionTable(TT_SIZE_MB, table_name)
+    table.age = age
+    new_move_ordering()
+    search = Search(table, stop_event=stop)
+    best_move, depth, score = search.iterative_deepening(gs, valid_moves, 1 + helper % 2, max_depth)
+    search.stats.best_move = None  # the move goes back as its move_ID, the stats only for their counts
+    search.stats.iterations = []
+    results.put((depth, best_move.move_ID if best_move is not None else 0, score, search.stats))
+    table.close()
+
+# seconds to spend on this move out of the remaining clock
+def allocate_time(remaining_time, increment):
+    return min(remaining_time / 30 + increment * 0.8, remaining_time / 2)
+
+
+class Search:
+    '''
+    One search and everything it keeps while it runs: the table it uses, its budget, the best root move
+    of the current iteration, its killer moves and its SearchStats. The root is the node at ply 0. None of that is global, so searches can run
+    side by side in one process (in threads, or one started from another's callback), sharing only the
+    transposition table and the history scores.
+
+    deadline is a time.perf_counter() value (see search_deadline), node_limit a node count and
+    stop_event a threading or multiprocessing Event, the search stops at whichever comes first, or
+    runs to the depth it is given when they are all None.'''
+    def __init__(self, table=None, deadline=None, node_limit=None, stop_event=None, callback=None):
+        self.table = table if table is not None else transposition_table
+        self.deadline = deadline
+        self.node_limit = node_limit
+        self.stop_event = stop_event
+        self.callback = callback
+        self.stats = SearchStats()
+        self.next_move = None  # best root move of the current iteration so far
+        self.killer_moves = [[0, 0] for _ in range(MAX_DEPTH + 1)]  # per ply, move_IDs of two quiet moves that caused a beta cutoff
+
+    # searches first_depth, first_depth+1, ... up to max_depth or until the budget runs out,
+    # returns (best move, depth, score) of the last iteration that finished (None, 0, None if none did)
+    def iterative_deepening(self, gs, valid_moves, first_depth=1, max_depth=MAX_DEPTH):
+        stats = self.stats
+        random.shuffle(valid_moves)
+        turn_multiplier = 1 if gs.white_to_move else -1
+        moves_made = len(gs.move_log)
+
+        best_move, best_depth, best_score = None, 0, None
+        for depth in range(first_depth, max_depth + 1):
+            self.next_move = None
+            iteration_start, iteration_nodes = time.perf_counter(), stats.total_nodes
+            try:
+                score = self.aspiration_search(gs, valid_moves, depth, best_score, turn_multiplier)
+            except SearchTimeout:
+                while len(gs.move_log) > moves_made:  # take back the moves of the unfinished iteration
+                    gs.undo_move()
+                break
+            if self.next_move is None:  # every move gets mated
+                break
+            best_move, best_depth, best_score = self.next_move, depth, score
+            stats.best_move, stats.depth, stats.score = best_move, depth, score
+            stats.elapsed = time.perf_counter() - stats.start_time
+            stats.iterations.append((depth, score, stats.total_nodes - iteration_nodes,
+                                     time.perf_counter() - iteration_start, self.principal_variation(gs, depth)))
+            if self.callback is not None:
+                self.callback(stats)
+            if abs(score) >= MATE_THRESHOLD or len(valid_moves) == 1:  # nothing to gain from searching deeper
+                break
+        stats.elapsed = time.perf_counter() - stats.start_time
+        return best_move, best_depth, best_score
+
+    '''
+    One iteration at the root. With USE_ASPIRATION and the score of the previous iteration, the window is
+    that score plus or minus ASPIRATION_WINDOW, which cuts off more than the full window as long as the score
+    doesn't move much. A score outside the window is only a bound, so that side of the window is opened
+    all the way and the iteration searched again. A score at a side already open all the way is a mate
+    score, and exact.'''
+    def aspiration_search(self, gs, valid_moves, depth, previous_score, turn_multiplier):
+        if not USE_ASPIRATION or previous_score is None or abs(previous_score) >= MATE_THRESHOLD:
+            return self.find_move_nega_max_alpha_beta(gs, valid_moves, depth, -CHECKMATE, CHECKMATE, turn_multiplier)
+        alpha, beta = previous_score - ASPIRATION_WINDOW, previous_score + ASPIRATION_WINDOW
+        while True:
+            score = self.find_move_nega_max_alpha_beta(gs, valid_moves, depth, alpha, beta, turn_multiplier)
+            if score <= alpha and alpha > -CHECKMATE:
+                alpha = -CHECKMATE
+            elif score >= beta and beta < CHECKMATE:
+                beta = CHECKMATE
+            else:
+                return score
+
+    # raise SearchTimeout once the time or node budget is used up or the stop event is set,
+    # the clock and the event are read every 256 nodes
+    def check_budget(self):
+        nodes = self.stats.nodes + self.stats.q_nodes
+        if self.node_limit is not None and nodes >= self.node_limit:
+            raise SearchTimeout()
+        if nodes & 255 == 0 and ((self.deadline is not None and time.perf_counter() > self.deadline) or
+                                 (self.stop_event is not None and self.stop_event.is_set())):
+            raise SearchTimeout()
+
+    # the line the search expects, following the best moves in the transposition table
+    def principal_variation(self, gs, max_length):
+        pv = []
+        for _ in range(max_length):
+            entry = self.table.probe(gs.hash_key)
+            if entry is None or not entry[3]:
+                break
+            move = find_move_by_ID(gs.get_valid_moves(), entry[3])
+            if move is None:  # a different position with the same table slot
+                break
+            gs.make_move(move)
+            pv.append(move)
+        for _ in pv:
+            gs.undo_move()
+        return pv
+
+    '''
+    Orders moves so the likely best ones are searched first and alpha-beta cuts off sooner:
+    --> the hash move, best move stored in the transposition table (the previous iteration's principal variation)
+    --> captures, most valuable victim first and the least valuable attacker first among those (MVV-LVA)
+    --> promotions
+    --> the two killer moves of this ply, quiet moves that caused a beta cutoff in a sibling position
+    --> the other quiet moves by history score, how often and how deep they caused beta cutoffs
+    --> underpromotions, they are hardly ever better than promoting to a queen'''
+    def order_moves(self, gs, moves, hash_move_ID, ply):
+        killers = self.killer_moves[ply]
+        history = history_scores[gs.white_to_move]
+
+        def move_score(move):
+            if move.move_ID == hash_move_ID:
+                return HASH_MOVE_SCORE
+            if move.is_pawn_promotion and move.promotion_piece != 'Q':
+                return -1
+            if move.piece_captured != '--':
+                return CAPTURE_SCORE + 10 * piece_score[move.piece_captured[1]] - piece_score[move.piece_moved[1]]
+            if move.is_pawn_promotion:
+                return PROMOTION_SCORE
+            if move.move_ID == killers[0]:
+                return KILLER_SCORE + 1
+            if move.move_ID == killers[1]:
+                return KILLER_SCORE
+            return history[move.move_ID]
+
+        moves.sort(key=move_score, reverse=True)  # stable, so equal moves keep the random root order
+
+    '''
+    Staged move picker for the nodes below the root, yields the moves in the order order_moves sorts them
+    but generates each stage only once the one before it is used up, so a node that cuts off early never
+    pays for the moves it didn't get to:
+    --> the hash move, checked for legality on its own (gs.legal_move_from_ID) without generating anything
+    --> the captures and promotions (gs.get_valid_captures)
+    --> the killer moves of this ply that are legal quiet moves here
+    --> the other quiet moves by history score, then the underpromotions
+    The last stage generates every move, which also sets the checkmate/stalemate flags, so when nothing
+    at all was yielded the node is checkmate or stalemate.'''
+    def staged_moves(self, gs, hash_move_ID, ply):
+        searched = []  # move_IDs already yielded
+        hash_move = gs.legal_move_from_ID(hash_move_ID)
+        if hash_move is not None:
+            searched.append(hash_move_ID)
+            yield hash_move
+
+        captures = gs.get_valid_captures()
+        self.order_moves(gs, captures, 0, ply)
+        underpromotions = []
+        for move in captures:
+            if move.is_pawn_promotion and move.promotion_piece != 'Q':
+                underpromotions.append(move)
+            elif move.move_ID != hash_move_ID:
+                yield move
+
+        for killer_ID in self.killer_moves[ply]:
+            if killer_ID in searched:
+                continue
+            killer = gs.legal_move_from_ID(killer_ID)
+            if killer is not None and killer.piece_captured == '--' and not killer.is_pawn_promotion:
+                searched.append(killer_ID)
+                yield killer
+
+        quiet_moves = [move for move in gs.get_valid_moves()
+                       if move.piece_captured == '--' and not move.is_pawn_promotion and move.move_ID not in searched]
+        self.order_moves(gs, quiet_moves, 0, ply)
+        yield from quiet_moves
+        for move in underpromotions:
+            if move.move_ID != hash_move_ID:
+                yield move
+
+    # plies a late quiet move is reduced by: one, two from the LMR_LATE_MOVES-th move on, one less with a good history
+    @staticmethod
+    def late_move_reduction(gs, move, move_number, depth):
+        reduction = 2 if move_number >= LMR_LATE_MOVES else 1
+        if history_scores[gs.white_to_move][move.move_ID] > LMR_HISTORY:
+            reduction -= 1
+        return min(reduction, depth - 2)
+
+    # remember a quiet move that caused a beta cutoff
+    def update_killers_and_history(self, gs, move, depth, ply):
+        killers = self.killer_moves[ply]
+        if killers[0] != move.move_ID:
+            killers[1] = killers[0]
+            killers[0] = move.move_ID
+        history_scores[gs.white_to_move][move.move_ID] += depth * depth
+
+    '''
+    valid_moves is None below the root, each node then takes its moves from staged_moves after the
+    transposition table lookup, so a cutoff from the table doesn't pay for move generation and a beta
+    cutoff from the hash move or a capture doesn't pay for the quiet moves. ply is the distance from the
+    root, reductions make depth a poor guide to it. On top of plain alpha-beta, each switchable:
+    --> null-move pruning (USE_NULL_MOVE): if the side to move could pass and a shallower search still
+        reaches beta, a real move surely would too. Not in check, not twice in a row, and not with only
+        pawns left where zugzwang (every move making things worse) is common
+    --> principal variation search (USE_PVS): after the first move, the others are only searched to prove
+        they are no better, with a null window (alpha, alpha + 1) that cuts off sooner. The few that turn
+        out better are searched again with the full window
+    --> late move reductions (USE_LMR): quiet moves late in the ordering are rarely the best, they are
+        searched a ply or two shallower (with a null window) and again at full depth if they beat alpha'''
+    def find_move_nega_max_alpha_beta(self, gs, valid_moves, depth, alpha, beta, turn_multiplier, ply=0, allow_null=True):
+        stats = self.stats
+        stats.nodes += 1
+        if ply > stats.sel_depth:
+            stats.sel_depth = ply
+        self.check_budget()
+        if ply > 0 and (gs.halfmove_clock >= 100 or gs.position_counts.get(gs.hash_key, 0) > 1):
+            # a position already on the board earlier, in the game or on the way here: whatever the best line
+            # from here is, the other side can repeat it, so it is a draw and the shuffling line ends now
+            return DRAW
+        alpha_original = alpha
+        entry = self.table.probe(gs.hash_key)
+        stats.tt_probes += 1
+        if entry is not None:
+            stats.tt_hits += 1
+        if ply > 0:  # the root always searches, it has to pick next_move
+            if entry is not None and entry[1] >= depth:
+                score, _, bound, _ = entry
+                score = score_from_table(score, ply)
+                if bound == EXACT:
+                    return score
+                elif bound == LOWER_BOUND:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+            if depth == 0:
+                return self.quiescence_search(gs, alpha, beta, turn_multiplier, ply)
+
+        in_check = (USE_NULL_MOVE or USE_LMR) and gs.in_check()
+        if (USE_NULL_MOVE and allow_null and ply > 0 and depth > NULL_MOVE_REDUCTION and not in_check
+                and abs(beta) < MATE_THRESHOLD and turn_multiplier * evaluation.evaluate(gs) >= beta and gs.has_non_pawn_material()):
+            moves_made = len(gs.move_log)
+            gs.make_null_move()
+            try:
+                score = -self.find_move_nega_max_alpha_beta(gs, None, depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1,
+                                                            -turn_multiplier, ply + 1, False)
+            except SearchTimeout:  # the null move isn't in the move log, take it back here after the moves on top of it
+                while len(gs.move_log) > moves_made:
+                    gs.undo_move()
+                gs.undo_null_move()
+                raise
+            gs.undo_null_move()
+            if score >= beta:
+                return beta if score >= MATE_THRESHOLD else score  # a mate found after passing proves nothing
+
+        hash_move_ID = entry[3] if entry is not None else 0
+        if valid_moves is None:
+            moves = self.staged_moves(gs, hash_move_ID, ply)
+        else:
+            self.order_moves(gs, valid_moves, hash_move_ID, ply)
+            moves = valid_moves
+        stats.expanded_nodes += 1
+        max_score = -CHECKMATE
+        best_move = None
+        move_number = -1  # stays -1 when there is no move to search
+        for move_number, move in enumerate(moves):
+            quiet = move.piece_captured == '--' and not move.is_pawn_promotion
+            reduction = 0
+            if USE_LMR and move_number >= LMR_FULL_MOVES and depth >= LMR_MIN_DEPTH and quiet and not in_check:
+                reduction = self.late_move_reduction(gs, move, move_number, depth)
+            gs.make_move(move)
+            if reduction and gs.in_check():  # checks are never reduced
+                reduction = 0
+            if move_number == 0 or not (USE_PVS or reduction):
+                score = -self.find_move_nega_max_alpha_beta(gs, None, depth-1, -beta, -alpha, -turn_multiplier, ply + 1) # get reversed for opponent
+            else:
+                score = -self.find_move_nega_max_alpha_beta(gs, None, depth-1-reduction, -alpha-1, -alpha, -turn_multiplier, ply + 1)
+                if score > alpha and reduction:  # the reduced search beat alpha, see if it holds at full depth
+                    if USE_PVS:
+                        score = -self.find_move_nega_max_alpha_beta(gs, None, depth-1, -alpha-1, -alpha, -turn_multiplier, ply + 1)
+                    else:
+                        score = -self.find_move_nega_max_alpha_beta(gs, None, depth-1, -beta, -alpha, -turn_multiplier, ply + 1)
+                if USE_PVS and alpha < score < beta:  # better than the first move, get its exact score
+                    score = -self.find_move_nega_max_alpha_beta(gs, None, depth-1, -beta, -alpha, -turn_multiplier, ply + 1)
+            if score > max_score or best_move is None:  # the first move stands even if it gets mated
+                max_score = score
+                best_move = move
+                if ply == 0:
+                    self.next_move = move
+            gs.undo_move()
+            if max_score > alpha:  # pruning happens
+                alpha = max_score
+            if alpha >= beta:
+                stats.cutoffs += 1
+                if move_number == 0:
+                    stats.first_move_cutoffs += 1
+                if quiet:
+                    self.update_killers_and_history(gs, move, depth, ply)
+                break
+        if move_number < 0:  # no legal move, the flags are those of this position as nothing was made on it
+            return ply - CHECKMATE if gs.checkmate else STALEMATE
+
+        if max_score <= alpha_original:
+            bound = UPPER_BOUND
+        elif max_score >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.table.store(gs.hash_key, depth, score_to_table(max_score, ply), bound, best_move.move_ID)
+        return max_score
+
+    '''
+    Quiescence search, run at the leaves instead of scoring the board straight away so a position in the
+    middle of an exchange isn't misjudged. Only captures and promotions are searched:
+    --> stand pat: the side to move can usually do at least as well as the static score by not capturing,
+        so a static score at or above beta cuts off, and one above alpha raises alpha
+    --> delta pruning: skip captures that leave the score below alpha even when the captured piece is
+        won for free with DELTA_MARGIN to spare
+    --> in check standing pat isn't an option, every evasion is searched (no evasions is mate)
+    --> underpromotions are left out unless they are evasions'''
+    def quiescence_search(self, gs, alpha, beta, turn_multiplier, ply):
+        stats = self.stats
+        stats.q_nodes += 1
+        if ply > stats.sel_depth:
+            stats.sel_depth = ply
+        self.check_budget()
+        if gs.in_check():
+            moves = gs.get_valid_moves()
+            if len(moves) == 0:
+                return ply - CHECKMATE
+            max_score = -CHECKMATE
+            stand_pat = None
+        else:
+            stand_pat = turn_multiplier * evaluation.evaluate(gs)  # not score_board, the mate flags may be another node's
+            if stand_pat >= beta:
+                return stand_pat
+            if stand_pat > alpha:
+                alpha = stand_pat
+            max_score = stand_pat
+            moves = gs.get_valid_captures()
+
+        self.order_moves(gs, moves, 0, 0)
+        for move in moves:
+            if stand_pat is not None:
+                if move.is_pawn_promotion:
+                    if move.promotion_piece != 'Q':
+                        continue
+                elif stand_pat + evaluation.PIECE_VALUES[move.piece_captured[1]] + DELTA_MARGIN <= alpha:
+                    continue
+            gs.make_move(move)
+            score = -self.quiescence_search(gs, -beta, -alpha, -turn_multiplier, ply + 1)
+            gs.undo_move()
+            if score > max_score:
+                max_score = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return max_score
+
+
+# history is kept from one search to the next but halved, the killers start empty with every Search
+def new_move_ordering():
+    for history in history_scores:
+        for i in range(len(history)):
+            history[i] //= 2
+
+# the table keeps a mate score counted from the position it is stored for, not from the root
+def score_to_table(score, ply):
+    if score >= MATE_THRESHOLD:
+        return score + ply
+    if score <= -MATE_THRESHOLD:
+        return score - ply
+    return score
+
+def score_from_table(score, ply):
+    if score >= MATE_THRESHOLD:
+        return score - ply
+    if score <= -MATE_THRESHOLD:
+        return score + ply
+    return score
+
+# moves to the mate a mate score stands for, negative when the side the score is for gets mated
+def mate_in(score):
+    moves = (CHECKMATE - abs(score) + 1) // 2
+    return moves if score > 0 else -moves
+
+def find_move_by_ID(moves, move_ID):
+    for move in moves:
+        if move.move_ID == move_ID:
+            return move
+    return None
+
+# looks two moves ahead, scoring the positions on material alone
+def find_best_move_two_ply(gs, valid_moves):
     '''# greedy algorithm
     turn_multiplier = 1 if gs.white_to_move else -1
     max_score = -CHECKMATE
@@ -64,92 +699,18 @@ def find_best_move(gs, valid_moves):
         gs.undo_move()
     return best_player_move
 
-# helper method to make first recursive call
+
+# helper method to make first recursive call, searches to a fixed DEPTH
 def find_best_move_(gs, valid_moves):
-    global next_move, counter
-    next_move = None
-    counter = 0
+    search = Search()
+    search.table.new_search()
+    new_move_ordering()
     random.shuffle(valid_moves)
-    #find_move_min_max(gs, valid_moves, DEPTH, gs.white_to_move)
-    #find_move_nega_max(gs, valid_moves, DEPTH, 1 if gs.white_to_move else -1)
-    find_move_nega_max_alpha_beta(gs, valid_moves, DEPTH, -CHECKMATE, CHECKMATE, 1 if gs.white_to_move else -1)
-    print(counter)
-    return next_move
-
-def find_move_min_max(gs, valid_moves, depth, white_to_move):
-    global next_move, counter
-
-    counter += 1
-    if depth == 0:
-        return score_material(gs.board)
-
-    if white_to_move:
-        max_score = -CHECKMATE
-        for move in valid_moves:
-            gs.make_move(move)
-            next_move = gs.get_valid_moves()
-            score = find_move_min_max(gs, next_move, depth-1, False)
-            if score > max_score:
-                max_score = score
-                if depth == DEPTH:
-                    next_move = move
-            gs.undo_move()
-        return max_score
-    else:
-        min_score = CHECKMATE
-        for move in valid_moves:
-            gs.make_move(move)
-            next_move = gs.get_valid_moves()
-            score = find_move_min_max(gs, next_move, depth-1, True)
-            if score < min_score:
-                min_score = score
-                if depth == DEPTH:
-                    next_move = move
-                gs.undo_move()
-            return min_score
-
-def find_move_nega_max(gs, valid_moves, depth, turn_multiplier):
-    global next_move, counter
-
-    counter += 1
-    if depth == 0:
-        return turn_multiplier * score_board(gs)
-
-    max_score = -CHECKMATE
-    for move in valid_moves:
-        gs.make_move(move)
-        next_move = gs.get_valid_moves()
-        score = -find_move_nega_max(gs, next_move, depth-1, -turn_multiplier)
-        if score > max_score:
-            max_score = score
-            if depth == DEPTH:
-                next_move = move
-        gs.undo_move()
-    return max_score
-
-def find_move_nega_max_alpha_beta(gs, valid_moves, depth, alpha, beta, turn_multiplier):
-    global next_move, counter
-
-    counter += 1
-    if depth == 0:
-        return turn_multiplier * score_board(gs)
-
-    # move ordering - evaluate capture or getting checked (implement later)2
-    max_score = -CHECKMATE
-    for move in valid_moves:
-        gs.make_move(move)
-        next_move = gs.get_valid_moves()
-        score = -find_move_nega_max_alpha_beta(gs, next_move, depth-1, -beta, -alpha, -turn_multiplier) # get reversed for opponent
-        if score > max_score:
-            max_score = score
-            if depth == DEPTH:
-                next_move = move
-        gs.undo_move()
-        if max_score > alpha:  # pruning happens
-            alpha = max_score
-        if alpha >= beta:
-            break
-    return max_score
+    score = search.find_move_nega_max_alpha_beta(gs, valid_moves, DEPTH, -CHECKMATE, CHECKMATE, 1 if gs.white_to_move else -1)
+    stats = search.stats
+    stats.best_move, stats.depth, stats.score = search.next_move, DEPTH, score
+    stats.elapsed = time.perf_counter() - stats.start_time
+    return search.next_move, stats
 
 '''Positive score is good for white, negative score is good for black'''
 def score_board(gs):
@@ -161,15 +722,7 @@ def score_board(gs):
     elif gs.stalemate:
         return STALEMATE
 
-    score = 0
-    for row in gs.board:
-        for square in row:
-            if square[0] == 'w':
-                score += piece_score[square[1]]
-            elif square[0] == 'b':
-                score -= piece_score[square[1]]
-
-    return score
+    return evaluation.evaluate(gs)  # material and piece-square tables, kept up to date by make/undo
 
 # score the board based on material
 def score_material(board):
@@ -0,0 +1,146 @@
+'''
+Batch analysis of a PGN archive: every position of every game is searched and the score after each
+move is added to the game as a comment, {[%eval 0.35]} in pawns from white's side, followed by the
+move the engine preferred when it isn't the one played. Games are spread over a pool of processes
+and written to the output file as soon as they (and every game before them) are done, in the order
+of the archive.
+
+The archive is read as a stream (pgn.read_games) and at most WINDOW games per worker are in flight,
+so memory stays the same whatever the size of the archive.
+
+    python -m Chess.analysis games.pgn -o annotated.pgn --workers 4 --depth 3
+    python -m Chess.analysis games.pgn --nodes 5000
+'''
+import argparse
+import collections
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from Chess import Chess_AI, pgn
+
+WORKERS = os.cpu_count() or 1
+WINDOW = 4  # games per worker submitted ahead of the one being written
+DEPTH = 3  # plies searched in every position
+REPORT_EVERY = 100  # games between progress lines
+
+
+# the eval comment of a score from white's side, a mate score as [%eval #N] (white mates in N moves) or
+# [%eval #-N]
+def format_score(score):
+    if abs(score) >= Chess_AI.MATE_THRESHOLD:
+        return '[%%eval #%d]' % Chess_AI.mate_in(score)
+    return '[%%eval %.2f]' % (score / 100)
+
+
+# (score from white's side, best move) of the position, a fixed depth search capped at max_nodes. The
+# score is None for a mate on the board, which gets no eval
+def analyse_position(gs, depth, max_nodes):
+    valid_moves = gs.get_valid_moves()
+    if len(valid_moves) == 0:
+        return (None if gs.checkmate else Chess_AI.STALEMATE), None
+    if gs.is_draw():
+        return Chess_AI.DRAW, None
+    search = Chess_AI.Search(node_limit=max_nodes)
+    search.table.new_search()
+    best_move, searched_depth, score = search.iterative_deepening(gs, valid_moves, 1, depth)
+    gs.get_valid_moves()  # a search cut short by max_nodes may have left another position's flags
+    if best_move is None:  # not even depth 1 finished in max_nodes
+        return None, None
+    return (score if gs.white_to_move else -score), best_move
+
+
+'''
+The game with a score comment after every move, (game, positions searched, error). Stops annotating
+at a move that isn't legal (the error says which), the moves after it are left as they are.'''
+def analyse_game(game, depth=DEPTH, max_nodes=None, bitboard=False):
+    scores = {}  # by ply, score after that many moves
+    best_moves = {}  # by ply, SAN of the engine's move where the move played differs
+    error = None
+    gs = None
+    played = 0
+    try:
+        for gs, move in game.replay(bitboard):
+            score, best_move = analyse_position(gs, depth, max_nodes)
+            scores[played] = score
+            if best_move is not None and best_move.move_ID != move.move_ID:
+                best_moves[played + 1] = gs.get_san(best_move)
+            played += 1
+        if gs is None:
+            gs = game.start_position(bitboard)
+        score, best_move = analyse_position(gs, depth, max_nodes)  # replay made the last move before it stopped
+        scores[played] = score
+    except ValueError as exception:
+        error = 'move %d: %s' % (played + 1, exception)
+
+    for ply, score in scores.items():
+        if ply == 0 or score is None:
+            continue
+        comment = format_score(score)
+        if ply in best_moves:
+            comment += ' ' + best_moves[ply] + ' was best'
+        game.comments[ply] = game.comments[ply] + ' ' + comment if ply in game.comments else comment
+    game.headers['Annotator'] = 'Chess engine, depth %d' % depth + (', %d nodes' % max_nodes if max_nodes else '')
+    return game, len(scores), error
+
+
+'''
+Annotates every game of the games iterable with workers processes and writes them to output (a text
+stream) as they come back, in order. At most WINDOW * workers games are submitted ahead of the one
+being written. Prints games and positions per second every REPORT_EVERY games and at the end,
+returns (games, positions, errors).'''
+def analyse_games(games, output, workers=WORKERS, depth=DEPTH, max_nodes=None, bitboard=False):
+    start = time.perf_counter()
+    count = positions = errors = 0
+
+    def write(result):
+        nonlocal count, positions, errors
+        game, game_positions, error = result
+        pgn.write_game(output, game)
+        output.flush()
+        count += 1
+        positions += game_positions
+        if error is not None:
+            errors += 1
+            print('game %d: %s' % (count, error), file=sys.stderr)
+        if count % REPORT_EVERY == 0:
+            report(count, positions, time.perf_counter() - start)
+
+    if workers <= 1:
+        for game in games:
+            write(analyse_game(game, depth, max_nodes, bitboard))
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            pending = collections.deque()
+            for game in games:
+                pending.append(pool.submit(analyse_game, game, depth, max_nodes, bitboard))
+                if len(pending) >= WINDOW * workers:
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+    report(count, positions, time.perf_counter() - start)
+    return count, positions, errors
+
+
+def report(games, positions, elapsed):
+    print('%d games, %d positions, %.2fs, %.2f games/s, %.1f positions/s' %
+          (games, positions, elapsed, games / elapsed if elapsed else 0.0, positions / elapsed if elapsed else 0.0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Annotate the games of a PGN file with engine scores.')
+    parser.add_argument('input', help='PGN file to analyse')
+    parser.add_argument('-o', '--output', help='annotated PGN file to write (default <input>-annotated.pgn)')
+    parser.add_argument('-d', '--depth', type=int, default=DEPTH, help='plies to search in every position (default %d)' % DEPTH)
+    parser.add_argument('--nodes', type=int, help='node limit of the search in every position')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='processes in the pool (default one per core)')
+    parser.add_argument('--bitboard', action='store_true', help='use the bitboard move generator')
+    args = parser.parse_args()
+    output = args.output or os.path.splitext(args.input)[0] + '-annotated.pgn'
+    with open(output, 'w', encoding='utf-8') as file:
+        analyse_games(pgn.read_pgn(args.input), file, args.workers, args.depth, args.nodes, args.bitboard)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,364 @@
+'''
+Bitboard backend for the GameState.
+Every piece type of every color is stored as one 64-bit integer where bit (8*row + col)
+is set when that piece stands on board[row][col], so row 0 is still black's back rank.
+The GameState keeps its 8*8 list board up to date as well (the UI draws from it), and
+calls toggle_move() from make_move/undo_move to keep the bitboards in sync.
+'''
+
+# index of each piece in BitBoards.pieces, white pieces first then black
+PIECE_INDEX = {'wP': 0, 'wN': 1, 'wB': 2, 'wR': 3, 'wQ': 4, 'wK': 5,
+               'bP': 6, 'bN': 7, 'bB': 8, 'bR': 9, 'bQ': 10, 'bK': 11}
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+FULL = (1 << 64) - 1
+
+SQUARES = [(sq // 8, sq % 8) for sq in range(64)]  # square index -> (row, col)
+
+# rank masks used by the pawn generator
+ROW_MASKS = [0xFF << (8 * r) for r in range(8)]
+
+# (row step, col step) for every ray; the first four increase the square index
+DIRECTIONS = ((0, 1), (1, -1), (1, 0), (1, 1), (0, -1), (-1, 1), (-1, 0), (-1, -1))
+ROOK_DIRECTIONS = (0, 2, 4, 6)
+BISHOP_DIRECTIONS = (1, 3, 5, 7)
+
+
+def _on_board(r, c):
+    return 0 <= r < 8 and 0 <= c < 8
+
+
+def _leaper_table(steps):
+    table = []
+    for r, c in SQUARES:
+        attacks = 0
+        for dr, dc in steps:
+            if _on_board(r + dr, c + dc):
+                attacks |= 1 << (8 * (r + dr) + c + dc)
+        table.append(attacks)
+    return table
+
+
+KNIGHT_ATTACKS = _leaper_table(((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)))
+KING_ATTACKS = _leaper_table(((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)))
+# squares attacked by a pawn of the given color standing on a square
+PAWN_ATTACKS = {'w': _leaper_table(((-1, -1), (-1, 1))), 'b': _leaper_table(((1, -1), (1, 1)))}
+
+# RAYS[d][sq] is every square from sq (exclusive) to the edge in direction d
+RAYS = []
+for dr, dc in DIRECTIONS:
+    rays = []
+    for r, c in SQUARES:
+        ray = 0
+        i = 1
+        while _on_board(r + dr * i, c + dc * i):
+            ray |= 1 << (8 * (r + dr * i) + c + dc * i)
+            i += 1
+        rays.append(ray)
+    RAYS.append(rays)
+
+# BETWEEN[a][b] is the squares strictly between a and b, LINE[a][b] the whole line through
+# both of them (0 when they don't share a rank, file or diagonal)
+BETWEEN = [[0] * 64 for _ in range(64)]
+LINE = [[0] * 64 for _ in range(64)]
+for d in range(8):
+    for a in range(64):
+        ray = RAYS[d][a]
+        b_bits = ray
+        while b_bits:
+            b = (b_bits & -b_bits).bit_length() - 1
+            b_bits &= b_bits - 1
+            BETWEEN[a][b] = ray & ~RAYS[d][b] & ~(1 << b)
+            LINE[a][b] = RAYS[d][a] | RAYS[(d + 4) % 8][a] | (1 << a)
+
+
+def _relevant_mask(sq, directions):
+    # the squares whose occupancy changes the attack set (the board edge never does)
+    mask = 0
+    for d in directions:
+        ray = RAYS[d][sq]
+        dr, dc = DIRECTIONS[d]
+        r, c = SQUARES[sq]
+        while _on_board(r + dr, c + dc):
+            r += dr
+            c += dc
+            if not _on_board(r + dr, c + dc):
+                ray &= ~(1 << (8 * r + c))  # drop the edge square
+        mask |= ray
+    return mask
+
+
+ROOK_MASKS = [_relevant_mask(sq, ROOK_DIRECTIONS) for sq in range(64)]
+BISHOP_MASKS = [_relevant_mask(sq, BISHOP_DIRECTIONS) for sq in range(64)]
+
+# sliding attack tables, keyed by the relevant occupancy of the square and filled on first use
+_rook_table = [{} for _ in range(64)]
+_bishop_table = [{} for _ in range(64)]
+
+
+def _slide(sq, occ, directions):
+    attacks = 0
+    for d in directions:
+        ray = RAYS[d][sq]
+        blockers = ray & occ
+        if blockers:
+            if d < 4:  # nearest blocker is the lowest bit
+                first = (blockers & -blockers).bit_length() - 1
+            else:  # nearest blocker is the highest bit
+                first = blockers.bit_length() - 1
+            ray ^= RAYS[d][first]
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(sq, occ):
+    key = occ & ROOK_MASKS[sq]
+    attacks = _rook_table[sq].get(key)
+    if attacks is None:
+        attacks = _rook_table[sq][key] = _slide(sq, key, ROOK_DIRECTIONS)
+    return attacks
+
+
+def bishop_attacks(sq, occ):
+    key = occ & BISHOP_MASKS[sq]
+    attacks = _bishop_table[sq].get(key)
+    if attacks is None:
+        attacks = _bishop_table[sq][key] = _slide(sq, key, BISHOP_DIRECTIONS)
+    return attacks
+
+
+def lsb(bb):
+    return (bb & -bb).bit_length() - 1
+
+
+class BitBoards:
+    def __init__(self, board):
+        self.pieces = [0] * 12
+        for r in range(8):
+            for c in range(8):
+                if board[r][c] != '--':
+                    self.pieces[PIECE_INDEX[board[r][c]]] |= 1 << (8 * r + c)
+        self.occupied = {'w': 0, 'b': 0}
+        for i in range(6):
+            self.occupied['w'] |= self.pieces[i]
+            self.occupied['b'] |= self.pieces[i + 6]
+
+    # make_move and undo_move flip the same bits, so one method does both
+    def toggle_move(self, move):
+        pieces = self.pieces
+        color = move.piece_moved[0]
+        start = 1 << (8 * move.start_row + move.start_col)
+        end = 1 << (8 * move.end_row + move.end_col)
+
+        pieces[PIECE_INDEX[move.piece_moved]] ^= start
+        if move.is_pawn_promotion:
+            pieces[PIECE_INDEX[color + move.promotion_piece]] ^= end
+        else:
+            pieces[PIECE_INDEX[move.piece_moved]] ^= end
+        self.occupied[color] ^= start | end
+
+        if move.piece_captured != '--':
+            if move.is_enpassant_move:
+                captured = 1 << (8 * move.start_row + move.end_col)
+            else:
+                captured = end
+            pieces[PIECE_INDEX[move.piece_captured]] ^= captured
+            self.occupied[move.piece_captured[0]] ^= captured
+
+        if move.is_castle_move:
+            if move.end_col - move.start_col == 2:  # kingside, rook h -> f
+                rook = (1 << (8 * move.end_row + 7)) | (1 << (8 * move.end_row + 5))
+            else:  # queenside, rook a -> d
+                rook = (1 << (8 * move.end_row)) | (1 << (8 * move.end_row + 3))
+            pieces[PIECE_INDEX[color + 'R']] ^= rook
+            self.occupied[color] ^= rook
+
+    # bitboard of the pieces of color `by` attacking square sq, given the occupancy occ
+    def attackers_to(self, sq, by, occ):
+        p = self.pieces
+        o = 0 if by == 'w' else 6
+        queens = p[o + QUEEN]
+        return ((KNIGHT_ATTACKS[sq] & p[o + KNIGHT]) | (KING_ATTACKS[sq] & p[o + KING])
+                | (PAWN_ATTACKS['b' if by == 'w' else 'w'][sq] & p[o + PAWN])
+                | (rook_attacks(sq, occ) & (p[o + ROOK] | queens))
+                | (bishop_attacks(sq, occ) & (p[o + BISHOP] | queens)))
+
+    def in_check(self, color):
+        king_sq = lsb(self.pieces[(0 if color == 'w' else 6) + KING])
+        return self.attackers_to(king_sq, 'b' if color == 'w' else 'w', self.occupied['w'] | self.occupied['b']) != 0
+
+    '''
+    Legal move generation. Checkers and pinned pieces are worked out once from the king square,
+    after that every emitted move is legal:
+    * the king may only step to squares the enemy doesn't attack (king lifted off the board)
+    * in double check only the king moves
+    * in single check the other pieces must capture the checker or block the check
+    * a pinned piece stays on the line through its king and the pinning piece
+    With captures_only just the captures and promotions are generated.
+    '''
+    def get_valid_moves(self, gs, move_class, captures_only=False):
+        moves = []
+        board = gs.board
+        p = self.pieces
+        if gs.white_to_move:
+            us, them, o, e = 'w', 'b', 0, 6
+        else:
+            us, them, o, e = 'b', 'w', 6, 0
+        own = self.occupied[us]
+        enemy = self.occupied[them]
+        occ = own | enemy
+        king_sq = lsb(p[o + KING])
+        checkers = self.attackers_to(king_sq, them, occ)
+
+        # pinned pieces, mapped to the line they are allowed to move on
+        pins = {}
+        enemy_rooks = p[e + ROOK] | p[e + QUEEN]
+        enemy_bishops = p[e + BISHOP] | p[e + QUEEN]
+        snipers = (rook_attacks(king_sq, enemy) & enemy_rooks) | (bishop_attacks(king_sq, enemy) & enemy_bishops)
+        while snipers:
+            s = lsb(snipers)
+            snipers &= snipers - 1
+            blockers = BETWEEN[king_sq][s] & occ
+            if blockers and not blockers & (blockers - 1) and blockers & own:
+                pins[lsb(blockers)] = LINE[king_sq][s]
+
+        # king moves
+        king_from = SQUARES[king_sq]
+        occ_without_king = occ ^ (1 << king_sq)
+        targets = KING_ATTACKS[king_sq] & (enemy if captures_only else ~own)
+        while targets:
+            to = lsb(targets)
+            targets &= targets - 1
+            if not self.attackers_to(to, them, occ_without_king):
+                moves.append(move_class(king_from, SQUARES[to], board))
+
+        if checkers & (checkers - 1):  # double check, only the king can move
+            return moves
+
+        if checkers:
+            target = BETWEEN[king_sq][lsb(checkers)] | checkers
+        else:
+            target = FULL & ~own
+        quiet_target = target  # pawn promotions are allowed with captures_only
+        if captures_only:
+            target &= enemy
+            quiet_target &= ROW_MASKS[0] | ROW_MASKS[7]
+
+        # knights, a pinned knight can never move
+        knights = p[o + KNIGHT]
+        while knights:
+            sq = lsb(knights)
+            knights &= knights - 1
+            if sq in pins:
+                continue
+            self._add_moves(sq, KNIGHT_ATTACKS[sq] & target, moves, board, move_class)
+
+        # sliders
+        for index, attacks_fn in ((BISHOP, bishop_attacks), (ROOK, rook_attacks),
+                                  (QUEEN, rook_attacks), (QUEEN, bishop_attacks)):
+            pieces = p[o + index]
+            while pieces:
+                sq = lsb(pieces)
+                pieces &= pieces - 1
+                attacks = attacks_fn(sq, occ) & target
+                if sq in pins:
+                    attacks &= pins[sq]
+                self._add_moves(sq, attacks, moves, board, move_class)
+
+        self._add_pawn_moves(gs, us, o, e, enemy, occ, king_sq, checkers, target, quiet_target, pins, moves, move_class)
+
+        if not checkers and not captures_only:
+            self._add_castle_moves(gs, us, them, king_sq, occ, moves, move_class)
+        return moves
+
+    @staticmethod
+    def _add_moves(sq, attacks, moves, board, move_class):
+        start = SQUARES[sq]
+        while attacks:
+            to = lsb(attacks)
+            attacks &= attacks - 1
+            moves.append(move_class(start, SQUARES[to], board))
+
+    def _add_pawn_moves(self, gs, us, o, e, enemy, occ, king_sq, checkers, target, quiet_target, pins, moves, move_class):
+        board = gs.board
+        pawns = self.pieces[o + PAWN]
+        forward = -8 if us == 'w' else 8
+        double_row = ROW_MASKS[4] if us == 'w' else ROW_MASKS[3]  # where two square advances land
+        last_row = ROW_MASKS[0] if us == 'w' else ROW_MASKS[7]
+        attack_table = PAWN_ATTACKS[us]
+        ep_bit = 0
+        if gs.enpassant_possible:
+            ep_bit = 1 << (8 * gs.enpassant_possible[0] + gs.enpassant_possible[1])
+
+        while pawns:
+            sq = lsb(pawns)
+            pawns &= pawns - 1
+            allowed = target
+            quiet_allowed = quiet_target
+            if sq in pins:
+                allowed &= pins[sq]
+                quiet_allowed &= pins[sq]
+            start = SQUARES[sq]
+
+            # advances
+            one = sq + forward
+            if not occ & (1 << one):
+                if quiet_allowed & (1 << one):
+                    if (1 << one) & last_row:
+                        self._add_promotions(start, SQUARES[one], moves, board, move_class)
+                    else:
+                        moves.append(move_class(start, SQUARES[one], board))
+                two = one + forward
+                if 0 <= two < 64 and (1 << two) & double_row and not occ & (1 << two) and quiet_allowed & (1 << two):
+                    moves.append(move_class(start, SQUARES[two], board))
+
+            # captures
+            attacks = attack_table[sq]
+            captures = attacks & enemy & allowed
+            if captures & last_row:
+                while captures:
+                    to = lsb(captures)
+                    captures &= captures - 1
+                    self._add_promotions(start, SQUARES[to], moves, board, move_class)
+            else:
+                self._add_moves(sq, captures, moves, board, move_class)
+
+            # en passant
+            if attacks & ep_bit:
+                ep_sq = lsb(ep_bit)
+                captured_sq = ep_sq - forward
+                if self._enpassant_is_legal(sq, ep_sq, captured_sq, e, occ, king_sq, checkers):
+                    moves.append(move_class(start, SQUARES[ep_sq], board, is_enpassant_move=True))
+
+    # one move for each piece the pawn can promote to
+    @staticmethod
+    def _add_promotions(start, end, moves, board, move_class):
+        for piece in move_class.PROMOTION_PIECES:
+            moves.append(move_class(start, end, board, promotion_piece=piece))
+
+    def _enpassant_is_legal(self, sq, ep_sq, captured_sq, e, occ, king_sq, checkers):
+        p = self.pieces
+        captured = 1 << captured_sq
+        # a knight or pawn checker has to be the captured pawn itself
+        if checkers & (p[e + KNIGHT] | p[e + PAWN]) & ~captured:
+            return False
+        # two pawns leave the board and one lands, so look again at every slider
+        occ_after = occ ^ (1 << sq) ^ captured ^ (1 << ep_sq)
+        if rook_attacks(king_sq, occ_after) & (p[e + ROOK] | p[e + QUEEN]):
+            return False
+        if bishop_attacks(king_sq, occ_after) & (p[e + BISHOP] | p[e + QUEEN]):
+            return False
+        return True
+
+    def _add_castle_moves(self, gs, us, them, king_sq, occ, moves, move_class):
+        rights = gs.current_castling_right
+        if us == 'w':
+            kingside, queenside = rights.wks, rights.wqs
+        else:
+            kingside, queenside = rights.bks, rights.bqs
+        r, c = SQUARES[king_sq]
+        if kingside and not occ & (0b11 << (king_sq + 1)):
+            if not self.attackers_to(king_sq + 1, them, occ) and not self.attackers_to(king_sq + 2, them, occ):
+                moves.append(move_class((r, c), (r, c + 2), gs.board, is_castle_move=True))
+        if queenside and not occ & (0b111 << (king_sq - 3)):
+            if not self.attackers_to(king_sq - 1, them, occ) and not self.attackers_to(king_sq - 2, them, occ):
+                moves.append(move_class((r, c), (r, c - 2), gs.board, is_castle_move=True))
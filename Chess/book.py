@@ -0,0 +1,155 @@
+'''
+Opening book. A book file is a sorted array of fixed-size records, (Zobrist key of the position,
+move_ID, weight) packed big-endian in RECORD, with every record of a position next to each other.
+OpeningBook opens it with mmap and finds a position by binary search on the keys, reading just the
+records it looks at, so a book of any size opens at once and costs no Python objects to keep.
+
+build_book() compiles PGN files into a book: every move played in the first plies of the games gets
+2 points for each game the side that played it won, 1 for a draw or an unknown result and 0 for a loss.
+The weights are those points, scaled down to fit 16 bits if they have to be.
+
+    python -m Chess.book games.pgn more.pgn -o book.bin --plies 16
+    python -m Chess.book --probe "<fen>" -o book.bin
+
+With an OpeningBook set as Chess_AI.opening_book (the UCI front end does it for its OwnBook and
+BookFile options) find_best_move plays a book move, picked at random in proportion to its weight,
+instead of searching whenever the position is in the book.
+'''
+import argparse
+import mmap
+import os
+import random
+import struct
+import time
+
+from Chess import ChessEngine, Chess_AI, pgn
+
+RECORD = struct.Struct('>QHH')  # key, move_ID, weight
+KEY = struct.Struct('>Q')
+MAX_WEIGHT = 0xFFFF
+PLIES = 20  # moves of every game that go in the book
+
+
+class OpeningBook:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        if size % RECORD.size:
+            self.file.close()
+            raise ValueError('%s is not a book file, its size is not a multiple of %d bytes' % (path, RECORD.size))
+        self.count = size // RECORD.size
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    def __len__(self):
+        return self.count
+
+    # index of the first record with a key >= key
+    def lower_bound(self, key):
+        low, high = 0, self.count
+        data = self.data
+        while low < high:
+            middle = (low + high) // 2
+            if KEY.unpack_from(data, middle * RECORD.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    # (move_ID, weight) of every book move of the position with this key, [] if it isn't in the book
+    def probe(self, key):
+        entries = []
+        i = self.lower_bound(key)
+        while i < self.count:
+            record_key, move_ID, weight = RECORD.unpack_from(self.data, i * RECORD.size)
+            if record_key != key:
+                break
+            entries.append((move_ID, weight))
+            i += 1
+        return entries
+
+    # a book move of gs picked at random in proportion to the weights, None if gs isn't in the book
+    def choose_move(self, gs, valid_moves=None):
+        entries = self.probe(gs.hash_key)
+        if not entries:
+            return None
+        if valid_moves is None:
+            valid_moves = gs.get_valid_moves()
+        moves, weights = [], []
+        for move_ID, weight in entries:
+            move = Chess_AI.find_move_by_ID(valid_moves, move_ID)
+            if move is not None and weight > 0:  # a position with the same key is in the book, not this one
+                moves.append(move)
+                weights.append(weight)
+        if not moves:
+            return None
+        return random.choices(moves, weights)[0]
+
+    def close(self):
+        if self.count:
+            self.data.close()
+        self.file.close()
+
+
+'''
+Compiles the games of the PGN files into a book file at output, from the first plies moves of every
+game. Returns the number of positions and moves written. Games are read as a stream, only the
+counts of the book moves are kept in memory. A game with an illegal move counts up to that move.'''
+def build_book(paths, output, plies=PLIES):
+    points = {}  # (key, move_ID) -> points
+    games = 0
+    start = time.perf_counter()
+    for path in paths:
+        for game in pgn.read_pgn(path):
+            games += 1
+            white_points = {'1-0': 2, '0-1': 0}.get(game.result, 1)
+            try:
+                for ply, (gs, move) in enumerate(game.replay()):
+                    if ply >= plies:
+                        break
+                    entry = (gs.hash_key, move.move_ID)
+                    points[entry] = points.get(entry, 0) + (white_points if gs.white_to_move else 2 - white_points)
+            except ValueError:
+                pass
+
+    scale = max(1, -(-max(points.values(), default=0) // MAX_WEIGHT))  # ceiling division
+    with open(output, 'wb') as file:
+        for (key, move_ID), weight in sorted(points.items()):
+            file.write(RECORD.pack(key, move_ID, -(-weight // scale)))
+    positions = len({key for key, move_ID in points})
+    print('%d games, %d positions, %d moves, %.2fs' % (games, positions, len(points), time.perf_counter() - start))
+    return positions, len(points)
+
+
+# prints the book moves of the position with their weights
+def print_book_moves(path, fen):
+    book = OpeningBook(path)
+    gs = ChessEngine.GameState.from_fen(fen)
+    valid_moves = gs.get_valid_moves()
+    entries = book.probe(gs.hash_key)
+    total = sum(weight for move_ID, weight in entries) or 1
+    for move_ID, weight in sorted(entries, key=lambda entry: -entry[1]):
+        move = Chess_AI.find_move_by_ID(valid_moves, move_ID)
+        print('%-8s weight %5d  %5.1f%%' % (gs.get_san(move, valid_moves) if move else '?', weight, 100 * weight / total))
+    if not entries:
+        print('not in the book')
+    book.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build an opening book from PGN files, or look a position up in one.')
+    parser.add_argument('pgn', nargs='*', help='PGN files to build the book from')
+    parser.add_argument('-o', '--output', default='book.bin', help='book file (default book.bin)')
+    parser.add_argument('--plies', type=int, default=PLIES, help='moves of every game that go in the book (default %d)' % PLIES)
+    parser.add_argument('--probe', metavar='FEN', help='print the book moves of a position instead of building')
+    args = parser.parse_args()
+    if args.probe:
+        print_book_moves(args.output, args.probe)
+    elif args.pgn:
+        build_book(args.pgn, args.output, args.plies)
+    else:
+        parser.error('give PGN files to build from or --probe')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+'''
+Evaluation by material and piece-square tables, in centipawns, positive is good for white.
+Every piece has a middlegame and an endgame value on each square, material (piece_score) plus
+the table bonus. GameState keeps the sums of both (mg_score, eg_score) and the game phase up to
+date in make_move/undo_move, so evaluate() is just a blend of the two by phase: all the middlegame
+score with every piece on the board, all the endgame score once only kings and pawns are left.
+'''
+
+piece_score = {'K': 0, 'Q': 10, 'R': 5, 'B': 3, 'N': 3, 'P': 1}  # material, in pawns
+PAWN_VALUE = 100
+PIECE_VALUES = {piece: value * PAWN_VALUE for piece, value in piece_score.items()}  # in centipawns
+
+# how much each piece counts towards the middlegame, 24 at the start of a game
+PHASE_WEIGHTS = {'K': 0, 'Q': 4, 'R': 2, 'B': 1, 'N': 1, 'P': 0}
+MAX_PHASE = 24
+
+# bonus for a white piece on board[row][col] (row 0 is the 8th rank), black uses the mirrored row
+pawn_table = [
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [50, 50, 50, 50, 50, 50, 50, 50],
+    [10, 10, 20, 30, 30, 20, 10, 10],
+    [5, 5, 10, 25, 25, 10, 5, 5],
+    [0, 0, 0, 20, 20, 0, 0, 0],
+    [5, -5, -10, 0, 0, -10, -5, 5],
+    [5, 10, 10, -20, -20, 10, 10, 5],
+    [0, 0, 0, 0, 0, 0, 0, 0]]
+
+pawn_endgame_table = [  # passed or not, a pawn is worth more the closer it is to promoting
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [80, 80, 80, 80, 80, 80, 80, 80],
+    [50, 50, 50, 50, 50, 50, 50, 50],
+    [30, 30, 30, 30, 30, 30, 30, 30],
+    [20, 20, 20, 20, 20, 20, 20, 20],
+    [10, 10, 10, 10, 10, 10, 10, 10],
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [0, 0, 0, 0, 0, 0, 0, 0]]
+
+knight_table = [
+    [-50, -40, -30, -30, -30, -30, -40, -50],
+    [-40, -20, 0, 0, 0, 0, -20, -40],
+    [-30, 0, 10, 15, 15, 10, 0, -30],
+    [-30, 5, 15, 20, 20, 15, 5, -30],
+    [-30, 0, 15, 20, 20, 15, 0, -30],
+    [-30, 5, 10, 15, 15, 10, 5, -30],
+    [-40, -20, 0, 5, 5, 0, -20, -40],
+    [-50, -40, -30, -30, -30, -30, -40, -50]]
+
+bishop_table = [
+    [-20, -10, -10, -10, -10, -10, -10, -20],
+    [-10, 0, 0, 0, 0, 0, 0, -10],
+    [-10, 0, 5, 10, 10, 5, 0, -10],
+    [-10, 5, 5, 10, 10, 5, 5, -10],
+    [-10, 0, 10, 10, 10, 10, 0, -10],
+    [-10, 10, 10, 10, 10, 10, 10, -10],
+    [-10, 5, 0, 0, 0, 0, 5, -10],
+    [-20, -10, -10, -10, -10, -10, -10, -20]]
+
+rook_table = [
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [5, 10, 10, 10, 10, 10, 10, 5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [0, 0, 0, 5, 5, 0, 0, 0]]
+
+queen_table = [
+    [-20, -10, -10, -5, -5, -10, -10, -20],
+    [-10, 0, 0, 0, 0, 0, 0, -10],
+    [-10, 0, 5, 5, 5, 5, 0, -10],
+    [-5, 0, 5, 5, 5, 5, 0, -5],
+    [0, 0, 5, 5, 5, 5, 0, -5],
+    [-10, 5, 5, 5, 5, 5, 0, -10],
+    [-10, 0, 5, 0, 0, 0, 0, -10],
+    [-20, -10, -10, -5, -5, -10, -10, -20]]
+
+king_table = [  # stay castled behind the pawns while there are pieces around
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-20, -30, -30, -40, -40, -30, -30, -20],
+    [-10, -20, -20, -20, -20, -20, -20, -10],
+    [20, 20, 0, 0, 0, 0, 20, 20],
+    [20, 30, 10, 0, 0, 10, 30, 20]]
+
+king_endgame_table = [  # walk to the centre once they are gone
+    [-50, -40, -30, -20, -20, -30, -40, -50],
+    [-30, -20, -10, 0, 0, -10, -20, -30],
+    [-30, -10, 20, 30, 30, 20, -10, -30],
+    [-30, -10, 30, 40, 40, 30, -10, -30],
+    [-30, -10, 30, 40, 40, 30, -10, -30],
+    [-30, -10, 20, 30, 30, 20, -10, -30],
+    [-30, -30, 0, 0, 0, 0, -30, -30],
+    [-50, -30, -30, -30, -30, -30, -30, -50]]
+
+middlegame_tables = {'P': pawn_table, 'N': knight_table, 'B': bishop_table,
+                     'R': rook_table, 'Q': queen_table, 'K': king_table}
+endgame_tables = {'P': pawn_endgame_table, 'N': knight_table, 'B': bishop_table,
+                  'R': rook_table, 'Q': queen_table, 'K': king_endgame_table}
+
+
+def _signed_values(tables):
+    # MG_VALUES['bN'][r][c] is what a black knight on board[r][c] adds to the score
+    values = {}
+    for piece_type, table in tables.items():
+        values['w' + piece_type] = [[PIECE_VALUES[piece_type] + table[r][c] for c in range(8)] for r in range(8)]
+        values['b' + piece_type] = [[-(PIECE_VALUES[piece_type] + table[7 - r][c]) for c in range(8)] for r in range(8)]
+    return values
+
+
+MG_VALUES = _signed_values(middlegame_tables)
+EG_VALUES = _signed_values(endgame_tables)
+PHASE = {color + piece_type: weight for color in 'wb' for piece_type, weight in PHASE_WEIGHTS.items()}
+
+
+# full recompute of (mg_score, eg_score, phase), make_move/undo_move only apply the differences
+def compute_scores(board):
+    mg_score = eg_score = phase = 0
+    for r in range(8):
+        for c in range(8):
+            piece = board[r][c]
+            if piece != '--':
+                mg_score += MG_VALUES[piece][r][c]
+                eg_score += EG_VALUES[piece][r][c]
+                phase += PHASE[piece]
+    return mg_score, eg_score, phase
+
+
+# blend the incrementally kept scores of the GameState by game phase
+def evaluate(gs):
+    phase = min(gs.phase, MAX_PHASE)  # promotions can push it over
+    return (gs.mg_score * phase + gs.eg_score * (MAX_PHASE - phase)) // MAX_PHASE
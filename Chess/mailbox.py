@@ -0,0 +1,291 @@
+'''
+10x12 mailbox board, a lighter alternative to the bitboards. The 8x8 board sits in the middle of
+a flat list of 120 squares with two rows of OFF_BOARD sentinels above and below it and one column
+on each side, so a knight jump or a slider step off the edge lands on a sentinel and no move needs
+a bounds check:
+
+    board[r][c]  <->  squares[21 + 10*r + c]
+
+Pieces are small ints, the piece type in the low 3 bits and BLACK set for black pieces, so a color
+test is a comparison instead of indexing a string. Like the bitboards, make_move/undo_move keep it
+in sync with GameState.board, which stays the view ChessMain draws from.
+'''
+EMPTY = 0
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(1, 7)
+BLACK = 8
+OFF_BOARD = 16
+
+PIECE_CODES = {'--': EMPTY}
+for color, offset in (('w', 0), ('b', BLACK)):
+    for piece_type, code in zip('PNBRQK', range(1, 7)):
+        PIECE_CODES[color + piece_type] = code + offset
+
+INDEX = [[21 + 10 * r + c for c in range(8)] for r in range(8)]  # INDEX[r][c], mailbox index of board[r][c]
+SQUARES = [None] * 120  # SQUARES[index], the (row, col) of a mailbox index
+for r in range(8):
+    for c in range(8):
+        SQUARES[INDEX[r][c]] = (r, c)
+BOARD_INDICES = [INDEX[r][c] for r in range(8) for c in range(8)]
+
+ORTHOGONAL = (-10, -1, 1, 10)
+DIAGONAL = (-11, -9, 9, 11)
+KING_STEPS = ORTHOGONAL + DIAGONAL
+KNIGHT_JUMPS = (-21, -19, -12, -8, 8, 12, 19, 21)
+
+
+class Mailbox:
+    def __init__(self, board):
+        self.squares = [OFF_BOARD] * 120
+        self.kings = {}
+        for r in range(8):
+            for c in range(8):
+                self.squares[INDEX[r][c]] = PIECE_CODES[board[r][c]]
+                if board[r][c][1] == 'K':
+                    self.kings[board[r][c][0]] = INDEX[r][c]
+
+    def make_move(self, move):
+        s = self.squares
+        start = INDEX[move.start_row][move.start_col]
+        end = INDEX[move.end_row][move.end_col]
+        s[start] = EMPTY
+        if move.is_pawn_promotion:
+            s[end] = PIECE_CODES[move.piece_moved[0] + move.promotion_piece]
+        else:
+            s[end] = PIECE_CODES[move.piece_moved]
+        if move.is_enpassant_move:
+            s[INDEX[move.start_row][move.end_col]] = EMPTY
+        if move.is_castle_move:
+            if move.end_col - move.start_col == 2:  # kingside, rook h -> f
+                s[end - 1], s[end + 1] = s[end + 1], EMPTY
+            else:  # queenside, rook a -> d
+                s[end + 1], s[end - 2] = s[end - 2], EMPTY
+        if move.piece_moved[1] == 'K':
+            self.kings[move.piece_moved[0]] = end
+
+    def undo_move(self, move):
+        s = self.squares
+        start = INDEX[move.start_row][move.start_col]
+        end = INDEX[move.end_row][move.end_col]
+        s[start] = PIECE_CODES[move.piece_moved]
+        if move.is_enpassant_move:
+            s[end] = EMPTY
+            s[INDEX[move.start_row][move.end_col]] = PIECE_CODES[move.piece_captured]
+        else:
+            s[end] = PIECE_CODES[move.piece_captured]
+        if move.is_castle_move:
+            if move.end_col - move.start_col == 2:
+                s[end + 1], s[end - 1] = s[end - 1], EMPTY
+            else:
+                s[end - 2], s[end + 1] = s[end + 1], EMPTY
+        if move.piece_moved[1] == 'K':
+            self.kings[move.piece_moved[0]] = start
+
+    # is square sq attacked by the pieces of color `by` ('w' or 'b')
+    def attacked(self, sq, by):
+        s = self.squares
+        offset = BLACK if by == 'b' else 0
+        knight, king = KNIGHT + offset, KING + offset
+        for jump in KNIGHT_JUMPS:
+            if s[sq + jump] == knight:
+                return True
+        for step in KING_STEPS:
+            if s[sq + step] == king:
+                return True
+        pawn = PAWN + offset
+        if by == 'b':  # black pawns capture towards higher indices
+            if s[sq - 9] == pawn or s[sq - 11] == pawn:
+                return True
+        elif s[sq + 9] == pawn or s[sq + 11] == pawn:
+            return True
+        rook, bishop, queen = ROOK + offset, BISHOP + offset, QUEEN + offset
+        for step in ORTHOGONAL:
+            to = sq + step
+            while s[to] == EMPTY:
+                to += step
+            if s[to] == rook or s[to] == queen:
+                return True
+        for step in DIAGONAL:
+            to = sq + step
+            while s[to] == EMPTY:
+                to += step
+            if s[to] == bishop or s[to] == queen:
+                return True
+        return False
+
+    def in_check(self, color):
+        return self.attacked(self.kings[color], 'b' if color == 'w' else 'w')
+
+    '''
+    Legal move generation, same scheme as the bitboards: one scan out from the king finds the
+    checking and the pinned pieces, then
+    * the king may only step to squares the enemy doesn't attack (king lifted off the board)
+    * in double check only the king moves
+    * in single check the other pieces must capture the checker or land between it and the king
+    * a pinned piece only moves along the line of its pin
+    With captures_only just the captures and promotions are generated.
+    '''
+    def get_valid_moves(self, gs, move_class, captures_only=False):
+        moves = []
+        s = self.squares
+        board = gs.board
+        if gs.white_to_move:
+            us, them, own_low, enemy_low = 'w', 'b', 1, 1 + BLACK
+        else:
+            us, them, own_low, enemy_low = 'b', 'w', 1 + BLACK, 1
+        own_high, enemy_high = own_low + 5, enemy_low + 5
+        enemy_offset = enemy_low - 1
+        king_sq = self.kings[us]
+
+        # checking pieces and pinned pieces, pins maps a pinned piece to the step along its pin
+        pins = {}
+        checks = 0
+        block_squares = ()  # with one check, the squares a move other than the king's has to land on
+        for steps, slider in ((ORTHOGONAL, ROOK), (DIAGONAL, BISHOP)):
+            slider, queen = slider + enemy_offset, QUEEN + enemy_offset
+            for step in steps:
+                to = king_sq + step
+                pinned = None
+                while True:
+                    code = s[to]
+                    if code == EMPTY:
+                        to += step
+                        continue
+                    if own_low <= code <= own_high and pinned is None:
+                        pinned = to
+                        to += step
+                        continue
+                    if code == slider or code == queen:
+                        if pinned is None:
+                            checks += 1
+                            block_squares = range(king_sq + step, to + step, step)
+                        else:
+                            pins[pinned] = step
+                    break
+        knight = KNIGHT + enemy_offset
+        for jump in KNIGHT_JUMPS:
+            if s[king_sq + jump] == knight:
+                checks += 1
+                block_squares = (king_sq + jump,)
+        pawn = PAWN + enemy_offset
+        for step in ((-11, -9) if us == 'w' else (9, 11)):
+            if s[king_sq + step] == pawn:
+                checks += 1
+                block_squares = (king_sq + step,)
+
+        # king moves, with the king off the board so it can't hide behind itself from a slider
+        king_from = SQUARES[king_sq]
+        s[king_sq] = EMPTY
+        for step in KING_STEPS:
+            to = king_sq + step
+            code = s[to]
+            if (enemy_low <= code <= enemy_high or (code == EMPTY and not captures_only)) and not self.attacked(to, them):
+                moves.append(move_class(king_from, SQUARES[to], board))
+        s[king_sq] = own_high
+
+        if checks > 1:  # double check, only the king can move
+            return moves
+        block = set(block_squares) if checks else None
+
+        for sq in BOARD_INDICES:
+            code = s[sq]
+            if not own_low <= code < own_high:  # the king is done
+                continue
+            piece_type = code - own_low + 1
+            pin = pins.get(sq)
+            start = SQUARES[sq]
+            if piece_type == PAWN:
+                self._add_pawn_moves(gs, sq, us, pin, block, captures_only, enemy_low, enemy_high, moves, move_class)
+                continue
+            if piece_type == KNIGHT:
+                if pin is not None:  # a pinned knight can never move
+                    continue
+                for jump in KNIGHT_JUMPS:
+                    to = sq + jump
+                    code = s[to]
+                    if (enemy_low <= code <= enemy_high or (code == EMPTY and not captures_only)) and (block is None or to in block):
+                        moves.append(move_class(start, SQUARES[to], board))
+                continue
+            if piece_type == ROOK:
+                steps = ORTHOGONAL
+            elif piece_type == BISHOP:
+                steps = DIAGONAL
+            else:
+                steps = KING_STEPS
+            for step in steps:
+                if pin is not None and step != pin and step != -pin:
+                    continue
+                to = sq + step
+                while s[to] == EMPTY:
+                    if not captures_only and (block is None or to in block):
+                        moves.append(move_class(start, SQUARES[to], board))
+                    to += step
+                if enemy_low <= s[to] <= enemy_high and (block is None or to in block):
+                    moves.append(move_class(start, SQUARES[to], board))
+
+        if not checks and not captures_only:
+            self._add_castle_moves(gs, us, them, king_sq, moves, move_class)
+        return moves
+
+    def _add_pawn_moves(self, gs, sq, us, pin, block, captures_only, enemy_low, enemy_high, moves, move_class):
+        s = self.squares
+        board = gs.board
+        start = SQUARES[sq]
+        if us == 'w':
+            forward, captures, double_start, last_row = -10, (-11, -9), 81, 21  # rows 6 and 0 start at 81 and 21
+        else:
+            forward, captures, double_start, last_row = 10, (9, 11), 31, 91
+        promotes = last_row <= sq + forward < last_row + 8
+
+        # advances, only promotions with captures_only
+        if (not captures_only or promotes) and (pin is None or pin == forward or pin == -forward):
+            to = sq + forward
+            if s[to] == EMPTY:
+                if block is None or to in block:
+                    self._add_pawn_move(start, SQUARES[to], promotes, board, moves, move_class)
+                two = to + forward
+                if double_start <= sq < double_start + 8 and s[two] == EMPTY and (block is None or two in block):
+                    moves.append(move_class(start, SQUARES[two], board))
+
+        for step in captures:
+            if pin is not None and step != pin and step != -pin:
+                continue
+            to = sq + step
+            if enemy_low <= s[to] <= enemy_high:
+                if block is None or to in block:
+                    self._add_pawn_move(start, SQUARES[to], promotes, board, moves, move_class)
+            elif gs.enpassant_possible and SQUARES[to] == gs.enpassant_possible:
+                captured = to - forward
+                if (block is None or to in block or captured in block) and self._enpassant_is_legal(sq, to, captured, us):
+                    moves.append(move_class(start, SQUARES[to], board, is_enpassant_move=True))
+
+    @staticmethod
+    def _add_pawn_move(start, end, promotes, board, moves, move_class):
+        if promotes:
+            for piece in move_class.PROMOTION_PIECES:
+                moves.append(move_class(start, end, board, promotion_piece=piece))
+        else:
+            moves.append(move_class(start, end, board))
+
+    # en passant takes two pawns off one row at once, which can expose the king, so try it on the board
+    def _enpassant_is_legal(self, sq, to, captured, us):
+        s = self.squares
+        pawn, taken = s[sq], s[captured]
+        s[sq], s[to], s[captured] = EMPTY, pawn, EMPTY
+        legal = not self.in_check(us)
+        s[sq], s[to], s[captured] = pawn, EMPTY, taken
+        return legal
+
+    def _add_castle_moves(self, gs, us, them, king_sq, moves, move_class):
+        s = self.squares
+        rights = gs.current_castling_right
+        if us == 'w':
+            kingside, queenside = rights.wks, rights.wqs
+        else:
+            kingside, queenside = rights.bks, rights.bqs
+        r, c = SQUARES[king_sq]
+        if kingside and s[king_sq + 1] == EMPTY and s[king_sq + 2] == EMPTY:
+            if not self.attacked(king_sq + 1, them) and not self.attacked(king_sq + 2, them):
+                moves.append(move_class((r, c), (r, c + 2), gs.board, is_castle_move=True))
+        if queenside and s[king_sq - 1] == EMPTY and s[king_sq - 2] == EMPTY and s[king_sq - 3] == EMPTY:
+            if not self.attacked(king_sq - 1, them) and not self.attacked(king_sq - 2, them):
+                moves.append(move_class((r, c), (r, c - 2), gs.board, is_castle_move=True))
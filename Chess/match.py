@@ -0,0 +1,281 @@
+'''
+Headless engine against engine matches, to measure whether a search change helps. Two engine
+configurations play every opening of OPENINGS twice, once with each color, over a pool of processes.
+A configuration is a string of key=value settings:
+
+    depth=4          plies to search (default 3)
+    time=0.2         seconds per move
+    nodes=20000      node limit per move
+    USE_LMR=0        any Chess_AI switch or constant (USE_*, LMR_*, NULL_MOVE_REDUCTION, ...)
+
+Games end at checkmate, stalemate, threefold repetition, the fifty-move rule or after MAX_PLIES
+plies (a draw). Every game is written to the PGN file as soon as it is over, and the running score is
+printed with the Elo difference of the first engine and its 95% error bars. With --sprt the match
+stops as soon as the sequential probability ratio test accepts either elo0 or elo1.
+
+    python -m Chess.match -a "depth=3" -b "depth=3 USE_LMR=0" --rounds 4 -o match.pgn
+    python -m Chess.match -a "nodes=5000" -b "nodes=5000 USE_NULL_MOVE=0" --rounds 100 --sprt 0 20
+'''
+import argparse
+import collections
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from Chess import ChessEngine, Chess_AI, pgn
+
+WORKERS = os.cpu_count() or 1
+WINDOW = 4  # games per worker submitted ahead
+MAX_PLIES = 300  # a game still going after this many plies is a draw
+DEFAULT_DEPTH = 3
+TABLE_SIZE_MB = 8  # transposition table of each engine in each worker
+
+# balanced openings as SAN moves, every one is played with both colors
+OPENINGS = [
+    'e4 e5 Nf3 Nc6 Bb5 a6',
+    'e4 e5 Nf3 Nc6 Bc4 Bc5',
+    'e4 e5 Nf3 Nf6 Nxe5 d6',
+    'e4 e5 f4 exf4 Nf3 g5',
+    'e4 c5 Nf3 d6 d4 cxd4 Nxd4 Nf6 Nc3 a6',
+    'e4 c5 Nf3 e6 d4 cxd4 Nxd4 Nc6',
+    'e4 c5 Nc3 Nc6 g3 g6',
+    'e4 e6 d4 d5 Nc3 Nf6',
+    'e4 c6 d4 d5 e5 Bf5',
+    'e4 d5 exd5 Qxd5 Nc3 Qa5',
+    'e4 d6 d4 Nf6 Nc3 g6',
+    'e4 Nf6 e5 Nd5 d4 d6',
+    'd4 d5 c4 e6 Nc3 Nf6',
+    'd4 d5 c4 c6 Nf3 Nf6',
+    'd4 d5 c4 dxc4 Nf3 Nf6',
+    'd4 d5 Bf4 Nf6 e3 c5',
+    'd4 Nf6 c4 g6 Nc3 Bg7 e4 d6',
+    'd4 Nf6 c4 e6 Nc3 Bb4',
+    'd4 Nf6 c4 e6 Nf3 b6',
+    'd4 Nf6 c4 c5 d5 e6',
+    'd4 f5 g3 Nf6 Bg2 g6',
+    'c4 e5 Nc3 Nf6 Nf3 Nc6',
+    'c4 c5 Nc3 Nc6 g3 g6',
+    'Nf3 d5 g3 Nf6 Bg2 e6',
+    'Nf3 Nf6 c4 b6 g3 Bb7',
+    'b3 e5 Bb2 Nc6 e3 d5',
+]
+
+# per engine in a worker process, (transposition table, history scores)
+engine_state = {}
+
+
+'''
+A configuration string as a dict, depth, time and nodes for the search and the Chess_AI settings by
+name with their values converted to the type of the current value. ValueError for an unknown key.'''
+def parse_config(text):
+    config = {}
+    for item in text.split():
+        key, _, value = item.partition('=')
+        if key == 'depth' or key == 'nodes':
+            config[key] = int(value)
+        elif key == 'time':
+            config[key] = float(value)
+        elif key.isupper() and hasattr(Chess_AI, key):
+            current = getattr(Chess_AI, key)
+            config[key] = value.lower() in ('1', 'true', 'on') if isinstance(current, bool) else type(current)(value)
+        else:
+            raise ValueError('unknown engine setting: ' + item)
+    if 'depth' not in config and 'time' not in config and 'nodes' not in config:
+        config['depth'] = DEFAULT_DEPTH
+    return config
+
+
+# the move the engine with config plays, with its own table and history and its Chess_AI settings in place
+def engine_move(gs, valid_moves, engine, config):
+    table, history = engine_state[engine]
+    settings = {key: value for key, value in config.items() if key.isupper()}
+    saved = {key: getattr(Chess_AI, key) for key in settings}
+    shared_history = Chess_AI.history_scores
+    for key, value in settings.items():
+        setattr(Chess_AI, key, value)
+    Chess_AI.history_scores = history
+    try:
+        move, stats = Chess_AI.find_best_move(gs, valid_moves, move_time=config.get('time', float('inf')),
+                                              max_nodes=config.get('nodes'), max_depth=config.get('depth', Chess_AI.MAX_DEPTH),
+                                              callback=None, table=table)
+    finally:
+        for key, value in saved.items():
+            setattr(Chess_AI, key, value)
+        Chess_AI.history_scores = shared_history
+    return move
+
+
+'''
+Plays one game from the opening, configs[0] is the engine with white. Returns the game as a pgn.Game
+with White, Black, Result and Termination headers.'''
+def play_game(round_number, opening, names, configs, seed):
+    random.seed(seed)
+    for engine in names:  # every game starts from an empty table and history
+        if engine not in engine_state:
+            engine_state[engine] = (Chess_AI.TranspositionTable(TABLE_SIZE_MB), [[0] * (1 << 14), [0] * (1 << 14)])
+        table, history = engine_state[engine]
+        table.clear()
+        for scores in history:
+            scores[:] = [0] * len(scores)
+
+    gs = ChessEngine.GameState(bitboard=True)
+    game = pgn.Game({'Event': 'Chess.match', 'Round': str(round_number), 'White': names[0], 'Black': names[1]})
+    for san in opening.split():
+        move = gs.parse_san(san)
+        game.moves.append(gs.get_san(move))
+        gs.make_move(move)
+    game.comments[len(game.moves)] = 'end of opening'
+
+    while True:
+        valid_moves = gs.get_valid_moves()
+        if len(valid_moves) == 0:
+            if gs.checkmate:
+                game.result, termination = ('0-1' if gs.white_to_move else '1-0'), 'checkmate'
+            else:
+                game.result, termination = '1/2-1/2', 'stalemate'
+            break
+        if gs.repetition_count() >= 3:
+            game.result, termination = '1/2-1/2', 'threefold repetition'
+            break
+        if gs.is_fifty_move_draw():
+            game.result, termination = '1/2-1/2', 'fifty-move rule'
+            break
+        if len(game.moves) >= MAX_PLIES:
+            game.result, termination = '1/2-1/2', 'move limit'
+            break
+        side = 0 if gs.white_to_move else 1
+        move = engine_move(gs, valid_moves, names[side], configs[side])
+        game.moves.append(gs.get_san(move, valid_moves))
+        gs.make_move(move)
+    game.headers['Termination'] = termination
+    return game
+
+
+# Elo difference for a score fraction, infinite at 0 and 1
+def elo(score):
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+# (Elo difference, its 95% confidence interval low, high) of wins, draws and losses
+def elo_interval(wins, draws, losses):
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, -math.inf, math.inf
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+    return elo(score), elo(score - margin), elo(score + margin)
+
+
+'''
+Log-likelihood ratio of elo1 against elo0 given wins, draws and losses, the normal approximation of the
+generalized SPRT: games * (s1 - s0) * (2 * mean - s0 - s1) / (2 * variance), with s0 and s1 the expected
+scores at elo0 and elo1 and mean and variance those of the game scores. Half a game is added to each of
+wins, draws and losses so the first few games, all won or all lost, don't have a variance of 0.'''
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    wins, draws, losses = wins + 0.5, draws + 0.5, losses + 0.5
+    games = wins + draws + losses
+    mean = (wins + draws / 2) / games
+    variance = (wins * (1 - mean) ** 2 + draws * (0.5 - mean) ** 2 + losses * mean ** 2) / games
+    s0 = 1 / (1 + 10 ** (-elo0 / 400))
+    s1 = 1 / (1 + 10 ** (-elo1 / 400))
+    return games * (s1 - s0) * (2 * mean - s0 - s1) / (2 * variance)
+
+
+# the LLR bounds of the SPRT: at or below the lower one elo0 is accepted, at or above the upper one elo1
+def sprt_bounds(alpha, beta):
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+'''
+Plays rounds rounds of OPENINGS with both colors between the configuration strings first and second,
+over workers processes. Every game goes to the PGN file output as soon as it is over. With sprt a
+(elo0, elo1) pair the match stops once the test accepts one of them (alpha and beta are its error
+rates). Returns (wins, draws, losses) of first.'''
+def run_match(first, second, rounds=1, workers=WORKERS, output='match.pgn', sprt=None, alpha=0.05, beta=0.05, openings=OPENINGS):
+    names = ('A: ' + (first or 'depth=%d' % DEFAULT_DEPTH), 'B: ' + (second or 'depth=%d' % DEFAULT_DEPTH))
+    configs = (parse_config(first), parse_config(second))
+    bounds = sprt_bounds(alpha, beta) if sprt else None
+    results = collections.Counter()  # from the first engine's side, 'win', 'draw', 'loss'
+    games = ((round_number * len(openings) + i, round_number + 1, opening, swap)
+             for round_number in range(rounds) for i, opening in enumerate(openings) for swap in (False, True))
+
+    def submit(pool, game_number, round_number, opening, swap):
+        game_names = (names[1], names[0]) if swap else names
+        game_configs = (configs[1], configs[0]) if swap else configs
+        return pool.submit(play_game, round_number, opening, game_names, game_configs, 2 * game_number + swap)
+
+    with open(output, 'w', encoding='utf-8') as file, ProcessPoolExecutor(workers) as pool:
+        pending = set()
+        finished = False
+        while not finished:
+            for game_number, round_number, opening, swap in games:
+                pending.add(submit(pool, game_number, round_number, opening, swap))
+                if len(pending) >= WINDOW * workers:
+                    break
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                game = future.result()
+                pgn.write_game(file, game)
+                file.flush()
+                first_white = game.headers['White'] == names[0]
+                if game.result == '1/2-1/2':
+                    results['draw'] += 1
+                elif (game.result == '1-0') == first_white:
+                    results['win'] += 1
+                else:
+                    results['loss'] += 1
+                llr = report(results, sprt, bounds, game)
+                if bounds is not None and (llr <= bounds[0] or llr >= bounds[1]):
+                    print('SPRT: %s accepted' % ('elo1 (%+g)' % sprt[1] if llr >= bounds[1] else 'elo0 (%+g)' % sprt[0]))
+                    finished = True
+                    for future in pending:
+                        future.cancel()
+                    break
+        pool.shutdown(cancel_futures=True)
+    return results['win'], results['draw'], results['loss']
+
+
+# prints the running score after a game, returns the LLR (None without SPRT)
+def report(results, sprt, bounds, game):
+    wins, draws, losses = results['win'], results['draw'], results['loss']
+    difference, low, high = elo_interval(wins, draws, losses)
+    line = 'games %d  +%d =%d -%d  score %.1f%%  elo %+.1f [%+.1f, %+.1f]  last %s %s (%s)' % (
+        wins + draws + losses, wins, draws, losses, 100 * (wins + draws / 2) / (wins + draws + losses),
+        difference, low, high, game.result, game.headers['Termination'], game.headers['White'])
+    llr = None
+    if sprt:
+        llr = sprt_llr(wins, draws, losses, *sprt)
+        line += '  LLR %.2f (%.2f, %.2f)' % (llr, bounds[0], bounds[1])
+    print(line)
+    return llr
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play two engine configurations against each other.')
+    parser.add_argument('-a', '--first', default='', help='settings of the first engine, e.g. "depth=3 USE_LMR=0"')
+    parser.add_argument('-b', '--second', default='', help='settings of the second engine')
+    parser.add_argument('--rounds', type=int, default=1, help='times through the opening suite, 2 games per opening each (default 1)')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='processes in the pool (default one per core)')
+    parser.add_argument('-o', '--output', default='match.pgn', help='PGN file the games are written to (default match.pgn)')
+    parser.add_argument('--sprt', type=float, nargs=2, metavar=('ELO0', 'ELO1'), help='stop early once SPRT accepts elo0 or elo1')
+    parser.add_argument('--alpha', type=float, default=0.05, help='SPRT false positive rate (default 0.05)')
+    parser.add_argument('--beta', type=float, default=0.05, help='SPRT false negative rate (default 0.05)')
+    args = parser.parse_args()
+    try:
+        parse_config(args.first)
+        parse_config(args.second)
+    except ValueError as exception:
+        parser.error(str(exception))
+    run_match(args.first, args.second, args.rounds, args.workers, args.output, args.sprt, args.alpha, args.beta)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+'''
+Perft and search spread over a pool of processes, one root move per task, since threads would
+all wait on the same GIL. A task is the binary snapshot of the root position (GameState.pack) and
+the move_ID of the root move, so sending it costs a few dozen bytes and every worker rebuilds
+its own GameState (and keeps its own transposition table between tasks).
+
+Perft adds up the counts of the root moves, in root move order, so it matches perft.perft().
+The search is a root split: the first root move is searched here with the full window to get
+a score to beat, then the others go to the pool. The best score so far is a shared value every
+worker reads as alpha before it starts a root move and raises when it finds a better one. A root
+move searched with a stale (lower) alpha only costs more nodes, and one that fails low returns a
+score no better than a score already found, so the best score is the one the single process
+search finds. Null moves, reductions and null windows (the Chess_AI.USE_* switches) depend on the
+window, which a worker only knows late, so the root split and its workers search with them off, and
+the single process search it matches is plain alpha-beta (single_process_search, --check compares them).
+
+    python -m Chess.parallel -d 5 --workers 8                perft of the start position
+    python -m Chess.parallel -d 4 --search --fen "<fen>"     best move of a position
+    python -m Chess.parallel -d 3 --check                    root split against the single process search
+    python -m Chess.parallel -d 5 --smp-benchmark            Lazy SMP time to depth, 1 to 8 workers
+
+The Lazy SMP search itself is Chess_AI.find_best_move_smp.
+'''
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from Chess import ChessEngine, Chess_AI, perft
+
+WORKERS = os.cpu_count() or 1  # default size of the process pool
+
+SELECTIVE_OPTIONS = ('USE_PVS', 'USE_NULL_MOVE', 'USE_LMR', 'USE_ASPIRATION')  # off in the root split
+
+shared_alpha = None  # in a worker, the best root score found so far (a multiprocessing.Value)
+
+
+# switches the selective search off, returns the settings to put back with _restore_options
+def _selective_search_off():
+    saved = {option: getattr(Chess_AI, option) for option in SELECTIVE_OPTIONS}
+    for option in SELECTIVE_OPTIONS:
+        setattr(Chess_AI, option, False)
+    return saved
+
+
+def _restore_options(saved):
+    for option, value in saved.items():
+        setattr(Chess_AI, option, value)
+
+
+def _init_worker(alpha):
+    global shared_alpha
+    shared_alpha = alpha
+    _selective_search_off()
+
+
+# the GameState after the root move, in a worker
+def _play_root_move(snapshot, bitboard, move_ID):
+    gs = ChessEngine.GameState.unpack(snapshot, bitboard)
+    gs.make_move(Chess_AI.find_move_by_ID(gs.get_valid_moves(), move_ID))
+    return gs
+
+
+def _perft_task(snapshot, bitboard, move_ID, depth):
+    return perft.perft(_play_root_move(snapshot, bitboard, move_ID), depth - 1)
+
+
+# perft of every root move, as a list of (move, nodes) in the order of gs.get_valid_moves()
+def parallel_divide(gs, depth, workers=WORKERS):
+    moves = gs.get_valid_moves()
+    snapshot = gs.pack()
+    bitboard = gs.bitboards is not None
+    with ProcessPoolExecutor(workers) as pool:
+        counts = list(pool.map(_perft_task, [snapshot] * len(moves), [bitboard] * len(moves),
+                               [move.move_ID for move in moves], [depth] * len(moves)))
+    return list(zip(moves, counts))
+
+
+def parallel_perft(gs, depth, workers=WORKERS):
+    if depth <= 1:
+        return perft.perft(gs, depth)
+    return sum(nodes for move, nodes in parallel_divide(gs, depth, workers))
+
+
+# score of one root move for the side to move at the root, with the SearchStats of its search
+def _search_root_move(gs, depth, alpha, beta, search=None):
+    search = search if search is not None else Chess_AI.Search()
+    turn_multiplier = 1 if gs.white_to_move else -1  # gs is after the root move, the opponent is to move
+    score = -search.find_move_nega_max_alpha_beta(gs, None, depth - 1, -beta, -alpha, turn_multiplier, 1)
+    return score, search.stats
+
+
+def _search_task(snapshot, bitboard, move_ID, depth):
+    gs = _play_root_move(snapshot, bitboard, move_ID)
+    Chess_AI.transposition_table.new_search()
+    Chess_AI.new_move_ordering()
+    alpha = shared_alpha.value
+    score, stats = _search_root_move(gs, depth, alpha, Chess_AI.CHECKMATE)
+    with shared_alpha.get_lock():
+        if score > shared_alpha.value:
+            shared_alpha.value = score
+    return score, alpha, stats
+
+
+'''
+Fixed depth plain alpha-beta search with the root moves split over workers processes. Returns
+(best move, Chess_AI.SearchStats), the stats count the nodes of every worker and their score is for
+the side to move, the score single_process_search gives. The best move is the first in root order
+with the best exact score: a move that failed low may return a score equal to the best one without
+being as good.'''
+def find_best_move_parallel(gs, valid_moves, depth=Chess_AI.DEPTH, workers=WORKERS):
+    if len(valid_moves) == 0:
+        return None, Chess_AI.SearchStats()
+    saved = _selective_search_off()
+    try:
+        return _root_split(gs, valid_moves, depth, workers)
+    finally:
+        _restore_options(saved)
+
+
+def _root_split(gs, valid_moves, depth, workers):
+    search = Chess_AI.Search()
+    search.table.new_search()
+    Chess_AI.new_move_ordering()
+    entry = search.table.probe(gs.hash_key)
+    search.order_moves(gs, valid_moves, entry[3] if entry is not None else 0, 0)
+
+    # the first move, hopefully the best, gives the others a score to beat
+    first_move = valid_moves[0]
+    gs.make_move(first_move)
+    best_score, stats = _search_root_move(gs, depth, -Chess_AI.CHECKMATE, Chess_AI.CHECKMATE, search)
+    gs.undo_move()
+    gs.get_valid_moves()  # restore the checkmate/stalemate flags of the root
+    best_move = first_move
+
+    if len(valid_moves) > 1:
+        snapshot = gs.pack()
+        bitboard = gs.bitboards is not None
+        rest = valid_moves[1:]
+        alpha = multiprocessing.Value('l', best_score)
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(alpha,)) as pool:
+            results = list(pool.map(_search_task, [snapshot] * len(rest), [bitboard] * len(rest),
+                                    [move.move_ID for move in rest], [depth] * len(rest)))
+        for move, (score, alpha_used, move_stats) in zip(rest, results):
+            stats.merge(move_stats)
+            if score > alpha_used and score > best_score:
+                best_score = score
+                best_move = move
+
+    stats.best_move, stats.depth, stats.score = best_move, depth, best_score
+    stats.elapsed = time.perf_counter() - stats.start_time
+    return best_move, stats
+
+
+# (best move, score) of the fixed depth plain alpha-beta search in this process that find_best_move_parallel matches
+def single_process_search(gs, depth=Chess_AI.DEPTH):
+    saved = _selective_search_off()
+    try:
+        search = Chess_AI.Search()
+        score = search.find_move_nega_max_alpha_beta(gs, gs.get_valid_moves(), depth, -Chess_AI.CHECKMATE, Chess_AI.CHECKMATE,
+                                                     1 if gs.white_to_move else -1)
+    finally:
+        _restore_options(saved)
+    gs.get_valid_moves()
+    return search.next_move, score
+
+
+# searches every fen with both and prints the two scores, returns the number of positions where they differ
+def check_root_split(fens, depth, workers=WORKERS, bitboard=False):
+    failed = 0
+    for fen in fens:
+        gs = perft.load_fen(fen, bitboard)
+        move, score = single_process_search(gs, depth)
+        parallel_move, stats = find_best_move_parallel(gs, gs.get_valid_moves(), depth, workers)
+        ok = stats.score == score
+        failed += not ok
+        print('%-4s %s  depth %d  single %s  parallel %s' % ('ok' if ok else 'FAIL', fen, depth, score, stats.score))
+    print('%d of %d positions ok' % (len(fens) - failed, len(fens)))
+    return failed
+
+
+# positions the Lazy SMP benchmark searches, the start position, Kiwipete and a quiet middlegame
+BENCHMARK_FENS = [perft.START_FEN,
+                  'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+                  'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10']
+
+
+'''
+Time for Chess_AI.find_best_move_smp to finish depth on every benchmark position with each number of
+workers, starting from an empty table and move ordering every time. Prints the total and the speedup
+over one worker.'''
+def smp_benchmark(depth, worker_counts=(1, 2, 4, 8), fens=BENCHMARK_FENS, bitboard=False):
+    times = {}
+    for workers in worker_counts:
+        times[workers] = 0.0
+        for fen in fens:
+            if Chess_AI.shared_table is not None:
+                Chess_AI.shared_table.clear()
+            for history in Chess_AI.history_scores:
+                history[:] = [0] * len(history)
+            gs = perft.load_fen(fen, bitboard)
+            start = time.perf_counter()
+            Chess_AI.find_best_move_smp(gs, gs.get_valid_moves(), workers, move_time=float('inf'), max_depth=depth, callback=None)
+            times[workers] += time.perf_counter() - start
+        print('workers %d  depth %d  time %.2fs  speedup %.2f' % (workers, depth, times[workers], times[worker_counts[0]] / times[workers]))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Perft or a fixed depth search over a pool of processes.')
+    parser.add_argument('-d', '--depth', type=int, default=4, help='plies to count or search (default 4)')
+    parser.add_argument('--fen', default=perft.START_FEN, help='position to start from (default the start position)')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='processes in the pool (default one per core)')
+    parser.add_argument('--search', action='store_true', help='search for the best move instead of counting nodes')
+    parser.add_argument('--check', action='store_true',
+                        help='compare the root split search with the single process one (on the benchmark positions without --fen)')
+    parser.add_argument('--smp-benchmark', action='store_true', help='time to depth of the Lazy SMP search with 1, 2, 4 and 8 workers')
+    parser.add_argument('--bitboard', action='store_true', help='use the bitboard move generator')
+    args = parser.parse_args()
+    gs = perft.load_fen(args.fen, args.bitboard)
+    if args.check:
+        check_root_split(BENCHMARK_FENS if args.fen == perft.START_FEN else [args.fen], args.depth, args.workers, args.bitboard)
+    elif args.smp_benchmark:
+        smp_benchmark(args.depth, bitboard=args.bitboard)
+    elif args.search:
+        best_move, stats = find_best_move_parallel(gs, gs.get_valid_moves(), args.depth, args.workers)
+        print('workers', args.workers, stats)
+    else:
+        start = time.perf_counter()
+        nodes = parallel_perft(gs, args.depth, args.workers)
+        elapsed = time.perf_counter() - start
+        print('depth', args.depth, 'nodes', nodes, 'time %.2fs' % elapsed, 'nps', int(nodes / elapsed) if elapsed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+'''
+Perft, counts the leaf nodes of the legal move tree to a fixed depth. The counts of the standard
+test positions are known, so a wrong count means a move generator bug, and divide (the count under
+each root move) narrows it down to the move that is off. Nodes per second is the number to
+compare between move generator changes.
+
+    python -m Chess.perft                        start position, depth 4
+    python -m Chess.perft -d 3 --fen "<fen>"     any position
+    python -m Chess.perft -d 3 --divide          count per root move
+    python -m Chess.perft --suite                check the bundled positions
+    python -m Chess.perft --suite --bitboard     same, with the bitboard move generator
+    python -m Chess.perft --suite --mailbox      same, with the 10x12 mailbox move generator
+    python -m Chess.perft --compare              nodes per second of the three board representations
+    python -m Chess.perft --memory               memory allocated per generated move
+    python -m Chess.perft --snapshots            check FEN and binary snapshots along random games
+'''
+import argparse
+import random
+import time
+import tracemalloc
+
+from Chess import ChessEngine
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+# (name, fen, [count at depth 1, depth 2, ...])
+SUITE = [
+    ('start position', START_FEN, [20, 400, 8902, 197281]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1', [48, 2039, 97862]),
+    ('position 3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', [14, 191, 2812, 43238]),
+    ('position 4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1', [6, 264, 9467]),
+    ('position 5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8', [44, 1486, 62379]),
+    ('position 6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10', [46, 2079, 89890]),
+    ('en passant pinned', '3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1', [18, 92, 1670, 10138, 185429]),
+    ('en passant discovers check', '8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1', [13, 102, 1266, 10276, 135655]),
+    ('en passant gives check', '8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1', [15, 126, 1928, 13931, 206379]),
+    ('short castle gives check', '5k2/8/8/8/8/8/8/4K2R w K - 0 1', [15, 66, 1198, 6399, 120330]),
+    ('long castle gives check', '3k4/8/8/8/8/8/8/R3K3 w Q - 0 1', [16, 71, 1286, 7418, 141077]),
+    ('castling rights', 'r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1', [26, 1141, 27826]),
+    ('castling prevented', 'r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1', [44, 1494, 50509]),
+    ('promote out of check', '2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1', [11, 133, 1442, 19174, 266199]),
+    ('discovered check', '8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1', [29, 165, 5160, 31961]),
+    ('promote to give check', '4k3/1P6/8/8/8/8/K7/8 w - - 0 1', [9, 40, 472, 2661, 38983]),
+    ('underpromote to give check', '8/P1k5/K7/8/8/8/8/8 w - - 0 1', [6, 27, 273, 1329, 18135]),
+    ('self stalemate', 'K1k5/8/P7/8/8/8/8/8 w - - 0 1', [2, 6, 13, 63, 382, 2217]),
+    ('stalemate and checkmate', '8/k1P5/8/1K6/8/8/8/8 w - - 0 1', [10, 25, 268, 926, 10857, 43261]),
+    ('checkmate', '8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1', [37, 183, 6559]),
+]
+
+
+# sets up a GameState from a FEN string, see GameState.from_fen
+def load_fen(fen, bitboard=False, mailbox=False):
+    return ChessEngine.GameState.from_fen(fen, bitboard, mailbox)
+
+
+# the FEN string of the position, what load_fen reads back
+def to_fen(gs):
+    return gs.to_fen()
+
+
+# number of leaf nodes depth plies below the position, the last ply is just counted, not played
+def perft(gs, depth):
+    moves = gs.get_valid_moves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        gs.make_move(move)
+        nodes += perft(gs, depth - 1)
+        gs.undo_move()
+    return nodes
+
+
+# perft of every root move, as a list of (move, nodes)
+def divide(gs, depth):
+    counts = []
+    for move in gs.get_valid_moves():
+        gs.make_move(move)
+        counts.append((move, perft(gs, depth - 1)))
+        gs.undo_move()
+    return counts
+
+
+def run_perft(fen, depth, bitboard=False, show_divide=False, mailbox=False):
+    gs = load_fen(fen, bitboard, mailbox)
+    start = time.perf_counter()
+    if show_divide:
+        counts = divide(gs, depth)
+        nodes = sum(count for move, count in counts)
+    else:
+        nodes = perft(gs, depth)
+    elapsed = time.perf_counter() - start
+    if show_divide:
+        for move, count in sorted(counts, key=lambda item: item[0].get_chess_notation()):
+            print(move.get_chess_notation() + ':', count)
+        print()
+    print('depth', depth, 'nodes', nodes, 'time %.2fs' % elapsed, 'nps', int(nodes / elapsed) if elapsed else 0)
+    return nodes
+
+
+# runs every position of the suite up to max_depth, returns True if all the counts match
+def run_suite(bitboard=False, max_depth=None, mailbox=False):
+    total_nodes = 0
+    failed = 0
+    start = time.perf_counter()
+    for name, fen, counts in SUITE:
+        depth = len(counts) if max_depth is None else min(max_depth, len(counts))
+        gs = load_fen(fen, bitboard, mailbox)
+        position_start = time.perf_counter()
+        nodes = perft(gs, depth)
+        elapsed = time.perf_counter() - position_start
+        total_nodes += nodes
+        expected = counts[depth - 1]
+        if nodes != expected:
+            failed += 1
+        print('%-28s depth %d  %9d  %s  %.2fs' % (name, depth, nodes, 'ok' if nodes == expected else 'FAILED, expected %d' % expected, elapsed))
+    elapsed = time.perf_counter() - start
+    print()
+    print('%d of %d positions ok, %d nodes in %.2fs, nps %d' % (len(SUITE) - failed, len(SUITE), total_nodes, elapsed, total_nodes / elapsed))
+    return failed == 0
+
+
+'''
+Nodes per second of the 8x8 list, the 10x12 mailbox and the bitboard move generators on the same
+positions, every count checked against the suite. Depth is capped at max_depth so it runs in a minute or so.'''
+def compare_representations(max_depth=3):
+    representations = [('8x8 list', {}), ('10x12 mailbox', {'mailbox': True}), ('bitboard', {'bitboard': True})]
+    results = []
+    for label, kwargs in representations:
+        total_nodes = 0
+        elapsed = 0.0
+        for name, fen, counts in SUITE:
+            depth = min(max_depth, len(counts))
+            gs = load_fen(fen, **kwargs)
+            start = time.perf_counter()
+            nodes = perft(gs, depth)
+            elapsed += time.perf_counter() - start
+            if nodes != counts[depth - 1]:
+                print('%s: %s FAILED, %d nodes, expected %d' % (label, name, nodes, counts[depth - 1]))
+            total_nodes += nodes
+        results.append((label, total_nodes / elapsed))
+        print('%-14s %d nodes  %.2fs  nps %d' % (label, total_nodes, elapsed, total_nodes / elapsed))
+    return results
+
+
+'''
+Memory the move generator allocates: keeps the legal moves of every position two plies below each
+suite position alive and measures them with tracemalloc, then reports the bytes and memory blocks
+per generated move and per node (position the moves were generated in).'''
+def allocation_benchmark(bitboard=False):
+    nodes = 0
+    moves_kept = []
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for name, fen, counts in SUITE:
+        gs = load_fen(fen, bitboard)
+        for move in gs.get_valid_moves():
+            gs.make_move(move)
+            for reply in gs.get_valid_moves():
+                gs.make_move(reply)
+                moves_kept.append(gs.get_valid_moves())
+                nodes += 1
+                gs.undo_move()
+            gs.undo_move()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    size = sum(stat.size_diff for stat in stats)
+    blocks = sum(stat.count_diff for stat in stats)
+    move_count = sum(len(moves) for moves in moves_kept)
+    print('%d nodes, %d moves, %.0f bytes and %.1f blocks per move, %.0f bytes and %.1f blocks per node' %
+          (nodes, move_count, size / move_count, blocks / move_count, size / nodes, blocks / nodes))
+    return size / move_count, blocks / move_count
+
+
+'''
+Checks GameState.to_fen/from_fen and pack/unpack against make_move: plays random games from every suite
+position and the start position and at every ply sets up a new GameState from the FEN and from the
+snapshot of the position make_move reached. Both have to give back the same FEN, hash key, halfmove
+clock, fullmove number and legal moves. Returns the number of positions that didn't.'''
+def check_snapshots(games=20, plies=200, bitboard=False):
+    random.seed(0)
+    positions = 0
+    failed = 0
+    start = time.perf_counter()
+    for game in range(games):
+        gs = load_fen(SUITE[game % len(SUITE)][1] if game else START_FEN, bitboard)
+        for ply in range(plies):
+            moves = gs.get_valid_moves()
+            fen = gs.to_fen()
+            move_IDs = sorted(move.move_ID for move in moves)
+            for copy in (ChessEngine.GameState.from_fen(fen, bitboard), ChessEngine.GameState.unpack(gs.pack(), bitboard)):
+                if (copy.to_fen() != fen or copy.hash_key != gs.hash_key or copy.halfmove_clock != gs.halfmove_clock or
+                        copy.fullmove_number != gs.fullmove_number or sorted(move.move_ID for move in copy.get_valid_moves()) != move_IDs):
+                    failed += 1
+                    print('FAILED', fen, 'came back as', copy.to_fen())
+            positions += 1
+            if not moves or gs.is_draw():
+                break
+            gs.make_move(random.choice(moves))
+    print('%d positions, %d failed, %.2fs' % (positions, failed, time.perf_counter() - start))
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Count the leaf nodes of the move tree to a fixed depth.')
+    parser.add_argument('-d', '--depth', type=int, help='plies to search (default 4, for --suite the deepest known count)')
+    parser.add_argument('--fen', default=START_FEN, help='position to count from (default the start position)')
+    parser.add_argument('--divide', action='store_true', help='print the count under every root move')
+    parser.add_argument('--suite', action='store_true', help='check the counts of the bundled test positions')
+    parser.add_argument('--memory', action='store_true', help='measure the memory allocated per generated move')
+    parser.add_argument('--bitboard', action='store_true', help='use the bitboard move generator')
+    parser.add_argument('--mailbox', action='store_true', help='use the 10x12 mailbox move generator')
+    parser.add_argument('--compare', action='store_true', help='nodes per second of the list, mailbox and bitboard generators')
+    parser.add_argument('--snapshots', action='store_true', help='check FEN and binary snapshots along random games')
+    args = parser.parse_args()
+    if args.compare:
+        compare_representations(args.depth or 3)
+    elif args.snapshots:
+        if check_snapshots(bitboard=args.bitboard):
+            raise SystemExit(1)
+    elif args.memory:
+        allocation_benchmark(args.bitboard)
+    elif args.suite:
+        if not run_suite(args.bitboard, args.depth, args.mailbox):
+            raise SystemExit(1)
+    else:
+        run_perft(args.fen, args.depth or 4, args.bitboard, args.divide, args.mailbox)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+'''
+Reads and writes games in PGN. read_games() is a generator that goes through the file a line at a
+time and holds one game at a time, so an archive of any size streams through in the memory of its
+longest game. A Game keeps the moves as the SAN strings of the file, they are only checked against
+the rules when the game is replayed (Game.replay). Comments and NAGs (the $1 glyphs) are kept with
+the move they follow, variations are skipped.
+
+    for game in pgn.read_pgn('games.pgn'):
+        for gs, move in game.replay():
+            ...
+'''
+import re
+
+from Chess import ChessEngine
+
+# the tags every game has, written first and in this order
+SEVEN_TAG_ROSTER = (('Event', '?'), ('Site', '?'), ('Date', '????.??.??'), ('Round', '?'),
+                    ('White', '?'), ('Black', '?'), ('Result', '*'))
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+LINE_LENGTH = 80  # movetext lines are wrapped before this
+
+TAG_PATTERN = re.compile(r'\[\s*(\w+)\s*"((?:[^"\\]|\\.)*)"\s*\]')
+# comments, line comments, NAGs, variation brackets, move numbers, results and everything else (the moves)
+TOKEN_PATTERN = re.compile(r'\{[^}]*\}?|;[^\n]*|\$\d+|[()]|\d+\.+|1-0|0-1|1/2-1/2|\*|[^\s{}();$]+')
+
+
+class Game:
+    '''
+    One game: headers is a dict of the tag pairs, moves the SAN strings of the main line, and comments
+    and nags dicts keyed by ply, the number of moves played before them (0 for a comment before the
+    first move).'''
+    def __init__(self, headers=None, moves=None, result='*'):
+        self.headers = dict(headers) if headers else {}
+        self.moves = list(moves) if moves else []
+        self.comments = {}
+        self.nags = {}
+        self.result = result
+
+    # the starting position, from the FEN tag if there is one
+    def start_position(self, bitboard=False):
+        if 'FEN' in self.headers:
+            return ChessEngine.GameState.from_fen(self.headers['FEN'], bitboard)
+        return ChessEngine.GameState(bitboard)
+
+    '''
+    Plays the game through from its starting position, yields (gs, move) before every move is made, with
+    move the Move the SAN string stands for. The moves are made on the same GameState. An illegal or
+    unreadable move raises ValueError.'''
+    def replay(self, bitboard=False):
+        gs = self.start_position(bitboard)
+        for san in self.moves:
+            move = gs.parse_san(san)
+            yield gs, move
+            gs.make_move(move)
+
+    # a Game of the moves gs was played through, SAN taken from a fresh replay of gs.move_log from start_fen
+    @classmethod
+    def from_game_state(cls, gs, headers=None, start_fen=None):
+        game = cls(headers)
+        if start_fen is not None:
+            game.headers['FEN'] = start_fen
+            game.headers['SetUp'] = '1'
+        replay = game.start_position()
+        for move in gs.move_log:
+            move = replay.legal_move_from_ID(move.move_ID)
+            game.moves.append(replay.get_san(move))
+            replay.make_move(move)
+        if len(replay.get_valid_moves()) == 0:
+            game.result = ('0-1' if replay.white_to_move else '1-0') if replay.checkmate else '1/2-1/2'
+        elif replay.is_draw():
+            game.result = '1/2-1/2'
+        game.headers['Result'] = game.result
+        return game
+
+
+# parses the movetext of one game into game
+def _parse_movetext(game, text):
+    depth = 0  # variation nesting, everything inside one is skipped
+    for token in TOKEN_PATTERN.findall(text):
+        first = token[0]
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth = max(depth - 1, 0)
+        elif depth or first == ';' or first.isdigit() and token.endswith('.'):
+            continue
+        elif first == '{':
+            comment = token[1:].rstrip('}').strip()
+            ply = len(game.moves)
+            game.comments[ply] = game.comments[ply] + ' ' + comment if ply in game.comments else comment
+        elif first == '$':
+            game.nags.setdefault(len(game.moves), []).append(int(token[1:]))
+        elif token in RESULTS:
+            game.result = token
+        else:
+            game.moves.append(token)
+
+
+'''
+Generator of the games of a PGN text stream, anything that yields lines (an open file, a list of
+strings). A game is its tag pairs followed by its movetext; a tag line after movetext starts the next
+game. Lines starting with % are skipped, as PGN allows.'''
+def read_games(lines):
+    headers = {}
+    movetext = []
+    in_comment = False  # inside a {} comment spanning lines, where a [ doesn't start a tag
+    for line in lines:
+        stripped = line.strip()
+        if not in_comment:
+            if not stripped or stripped[0] == '%':
+                continue
+            if stripped[0] == '[':
+                if movetext:
+                    yield _make_game(headers, movetext)
+                    headers, movetext = {}, []
+                for key, value in TAG_PATTERN.findall(stripped):
+                    headers[key] = value.replace('\\"', '"').replace('\\\\', '\\')
+                continue
+        movetext.append(stripped)
+        # track braces outside ; comments to know if the next line is still inside a comment
+        for char in stripped:
+            if char == '{':
+                in_comment = True
+            elif char == '}':
+                in_comment = False
+            elif char == ';' and not in_comment:
+                break
+    if headers or movetext:
+        yield _make_game(headers, movetext)
+
+
+def _make_game(headers, movetext):
+    game = Game(headers, result=headers.get('Result', '*'))
+    _parse_movetext(game, '\n'.join(movetext))
+    return game
+
+
+# games of a PGN file, read as it goes
+def read_pgn(path):
+    with open(path, encoding='utf-8', errors='replace') as file:
+        yield from read_games(file)
+
+
+# the PGN text of a game, tags first then the movetext wrapped before LINE_LENGTH, ending with a blank line
+def format_game(game):
+    headers = dict(game.headers)
+    headers['Result'] = game.result
+    lines = []
+    for key, default in SEVEN_TAG_ROSTER:
+        lines.append('[%s "%s"]' % (key, _escape(headers.pop(key, default))))
+    for key, value in headers.items():
+        lines.append('[%s "%s"]' % (key, _escape(value)))
+    lines.append('')
+
+    fen = game.headers.get('FEN')
+    fields = fen.split() if fen else []
+    white_to_move = len(fields) < 2 or fields[1] == 'w'
+    move_number = int(fields[5]) if len(fields) > 5 else 1
+    tokens = []
+    if 0 in game.comments:
+        tokens.append('{' + _clean_comment(game.comments[0]) + '}')
+    number_next = True  # a black move needs its number at the start and after a comment
+    for ply, san in enumerate(game.moves, 1):
+        if white_to_move:
+            tokens.append('%d.' % move_number)
+        elif number_next:
+            tokens.append('%d...' % move_number)
+        tokens.append(san)
+        number_next = False
+        for nag in game.nags.get(ply, ()):
+            tokens.append('$%d' % nag)
+        if ply in game.comments:
+            tokens.append('{' + _clean_comment(game.comments[ply]) + '}')
+            number_next = True
+        if not white_to_move:
+            move_number += 1
+        white_to_move = not white_to_move
+    tokens.append(game.result)
+
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) >= LINE_LENGTH:
+            lines.append(line)
+            line = token
+        else:
+            line = line + ' ' + token if line else token
+    lines.append(line)
+    return '\n'.join(lines) + '\n\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+# a comment can't hold the brace that would end it
+def _clean_comment(comment):
+    return comment.replace('}', ')')
+
+
+def write_game(stream, game):
+    stream.write(format_game(game))
+
+
+# writes games to a PGN file one at a time, games can be any iterable including a generator
+def write_pgn(path, games):
+    with open(path, 'w', encoding='utf-8') as file:
+        for game in games:
+            write_game(file, game)
@@ -0,0 +1,128 @@
+'''
+What each part of the selective search is worth: searches the benchmark positions to a fixed depth
+with plain alpha-beta (every Chess_AI.USE_* switch off), with each switch on by itself and with all
+of them on, and prints the nodes and the time to depth of each against plain alpha-beta.
+
+    python -m Chess.search_benchmark -d 5
+    python -m Chess.search_benchmark -d 6 --fen "<fen>" --bitboard
+    python -m Chess.search_benchmark --mates                        check the bundled mate positions
+'''
+import argparse
+import random
+
+from Chess import Chess_AI, parallel, perft
+
+OPTIONS = ['USE_PVS', 'USE_NULL_MOVE', 'USE_LMR', 'USE_ASPIRATION']
+
+# the Lazy SMP positions and two endgames, where null moves have to watch out for zugzwang
+BENCHMARK_FENS = parallel.BENCHMARK_FENS + ['8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+                                            '6k1/5pp1/7p/8/8/7P/5PP1/3R2K1 w - - 0 1']
+
+# (fen, depth, score for the side to move, the moves that get it or None for any). A mate further
+# than one ply away has to come out as a mate, not as the draw of a node without moves, and a mate
+# ply plies from the root scores CHECKMATE - ply
+MATE_SUITE = [
+    ('kbK5/pp6/1P6/8/8/8/8/R7 w - - 0 1', 3, Chess_AI.CHECKMATE - 3, ['a1a6']),  # Ra6 bxa6 b7#, every black move loses
+    ('r5k1/5ppp/8/8/8/8/3R1PPP/3R2K1 w - - 0 1', 3, Chess_AI.CHECKMATE - 3, ['d2d8']),  # Rd8+ Rxd8 Rxd8#
+    ('k7/8/1K6/8/8/8/8/7R b - - 0 1', 2, 2 - Chess_AI.CHECKMATE, None),  # Kb8 Rh8#
+]
+MATE_NODES = 1000000  # a mate search that takes more than this is taken as one that never ends
+
+
+# nodes and seconds to search every position to depth with the switches in options on and the others off
+def search_to_depth(depth, options, fens=BENCHMARK_FENS, bitboard=False):
+    saved = {option: getattr(Chess_AI, option) for option in OPTIONS}
+    for option in OPTIONS:
+        setattr(Chess_AI, option, option in options)
+    nodes = 0
+    elapsed = 0.0
+    try:
+        for fen in fens:
+            random.seed(0)  # same root move order for every configuration
+            Chess_AI.transposition_table.clear()
+            for history in Chess_AI.history_scores:
+                history[:] = [0] * len(history)
+            Chess_AI.new_move_ordering()
+            gs = perft.load_fen(fen, bitboard)
+            search = Chess_AI.Search()
+            search.iterative_deepening(gs, gs.get_valid_moves(), 1, depth)
+            elapsed += search.stats.elapsed
+            nodes += search.stats.total_nodes
+    finally:
+        for option, value in saved.items():
+            setattr(Chess_AI, option, value)
+    return nodes, elapsed
+
+
+def run_benchmark(depth, fens=BENCHMARK_FENS, bitboard=False):
+    configurations = [('alpha-beta', [])] + [(option[4:].lower(), [option]) for option in OPTIONS] + [('all', OPTIONS)]
+    results = {}
+    for name, options in configurations:
+        nodes, elapsed = search_to_depth(depth, options, fens, bitboard)
+        results[name] = (nodes, elapsed)
+        base_nodes, base_time = results['alpha-beta']
+        print('%-12s depth %d  nodes %9d (%5.1f%%)  time %7.2fs (%5.1f%%)' %
+              (name, depth, nodes, 100.0 * nodes / base_nodes, elapsed, 100.0 * elapsed / base_time))
+    return results
+
+
+'''
+Searches every MATE_SUITE position to its depth with the full window and plain alpha-beta: the first
+position is a zugzwang, which null-move pruning can't see by design. Then again with iterative deepening
+and USE_ASPIRATION, where the mate turns up after scores that aren't, outside the aspiration window
+(a position with a single move is left out, iterative deepening doesn't search deeper than depth 1 there).
+MATE_NODES caps every search so a search that doesn't end fails instead. Returns the number that failed.'''
+def check_mates(bitboard=False):
+    saved = {option: getattr(Chess_AI, option) for option in OPTIONS}
+    for option in OPTIONS:
+        setattr(Chess_AI, option, False)
+    failed = 0
+    try:
+        for fen, depth, expected_score, expected_moves in MATE_SUITE:
+            Chess_AI.transposition_table.clear()
+            gs = perft.load_fen(fen, bitboard)
+            search = Chess_AI.Search()
+            score = search.find_move_nega_max_alpha_beta(gs, gs.get_valid_moves(), depth, -Chess_AI.CHECKMATE, Chess_AI.CHECKMATE,
+                                                         1 if gs.white_to_move else -1)
+            move = search.next_move.get_chess_notation() if search.next_move is not None else None
+            failed += not report_mate(fen, depth, score, move, expected_score, expected_moves, 'alpha-beta')
+
+        Chess_AI.USE_ASPIRATION = True
+        for fen, depth, expected_score, expected_moves in MATE_SUITE:
+            Chess_AI.transposition_table.clear()
+            gs = perft.load_fen(fen, bitboard)
+            valid_moves = gs.get_valid_moves()
+            if len(valid_moves) == 1:
+                continue
+            best_move, searched_depth, score = Chess_AI.Search(node_limit=MATE_NODES).iterative_deepening(gs, valid_moves, 1, depth)
+            move = best_move.get_chess_notation() if best_move is not None else None
+            failed += not report_mate(fen, depth, score, move, expected_score, expected_moves, 'aspiration')
+    finally:
+        for option, value in saved.items():
+            setattr(Chess_AI, option, value)
+    print('%d failed' % failed)
+    return failed
+
+
+# prints the result of one mate search, returns whether it is the expected one
+def report_mate(fen, depth, score, move, expected_score, expected_moves, name):
+    ok = score == expected_score and (expected_moves is None or move in expected_moves)
+    print('%-4s %-10s %s  depth %d  score %s  move %s' % ('ok' if ok else 'FAIL', name, fen, depth, score, move))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Nodes and time to depth with each selective search option.')
+    parser.add_argument('-d', '--depth', type=int, default=5, help='depth to search to (default 5)')
+    parser.add_argument('--fen', help='a position to search instead of the benchmark positions')
+    parser.add_argument('--bitboard', action='store_true', help='use the bitboard move generator')
+    parser.add_argument('--mates', action='store_true', help='check the mate positions instead of benchmarking')
+    args = parser.parse_args()
+    if args.mates:
+        check_mates(args.bitboard)
+        return
+    run_benchmark(args.depth, [args.fen] if args.fen else BENCHMARK_FENS, args.bitboard)
+
+
+if __name__ == '__main__':
+    main()
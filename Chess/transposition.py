@@ -0,0 +1,149 @@
+'''
+Fixed-size transposition table for the search.
+Entries live in two flat arrays of unsigned 64-bit ints, one with the full Zobrist key of the
+position and one with the rest of the entry packed into a single int:
+    bits  0-31  score + SCORE_OFFSET
+    bits 32-39  depth searched
+    bits 40-41  bound type (EXACT, LOWER_BOUND, UPPER_BOUND), 0 marks an empty slot
+    bits 42-47  age, the search the entry was written in
+    bits 48-63  move_ID of the best move (0 if there is none)
+Every bucket has two slots: the first keeps the deepest entry of the current search, the second
+takes whatever doesn't get into the first (always replace). Entries from older searches can be
+replaced in either slot, so new_search() between moves is all the eviction needed.
+
+SharedTranspositionTable keeps the same entries in a multiprocessing.shared_memory block so several
+processes can search into one table. There are no locks: the key slot holds key XOR data, so an
+entry torn by two processes writing it at the same time doesn't match its key any more and is
+just a miss.
+'''
+from array import array
+from multiprocessing import shared_memory
+
+EXACT = 1
+LOWER_BOUND = 2  # the score failed high, real score >= score
+UPPER_BOUND = 3  # the score failed low, real score <= score
+
+SCORE_OFFSET = 1 << 31
+ENTRY_BYTES = 16  # 8 for the key, 8 for the packed data
+
+
+# biggest power of 2 number of buckets that fits in size_mb
+def bucket_count(size_mb):
+    buckets = 1
+    while buckets * 2 * 2 * ENTRY_BYTES <= size_mb * 1024 * 1024:
+        buckets *= 2
+    return buckets
+
+
+class TranspositionTable:
+    def __init__(self, size_mb=16):
+        buckets = bucket_count(size_mb)
+        self.mask = buckets - 1
+        self.keys = array('Q', bytes(8 * 2 * buckets))
+        self.data = array('Q', bytes(8 * 2 * buckets))
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    # call between moves, older entries become replaceable and the counters restart
+    def new_search(self):
+        self.age = (self.age + 1) & 63
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def clear(self):
+        self.keys = array('Q', bytes(len(self.keys) * 8))
+        self.data = array('Q', bytes(len(self.data) * 8))
+
+    # returns (score, depth, bound, move_ID) for the position, None if it isn't stored
+    def probe(self, key):
+        self.probes += 1
+        i = (key & self.mask) << 1
+        keys = self.keys
+        if keys[i] == key:
+            entry = self.data[i]
+        elif keys[i+1] == key:
+            entry = self.data[i+1]
+        else:
+            return None
+        if entry == 0:
+            return None
+        self.hits += 1
+        return (entry & 0xFFFFFFFF) - SCORE_OFFSET, (entry >> 32) & 0xFF, (entry >> 40) & 3, entry >> 48
+
+    def store(self, key, depth, score, bound, move_ID=0):
+        self.stores += 1
+        i = (key & self.mask) << 1
+        old = self.data[i]
+        # depth preferred slot: take it if it is empty, the same position, stale or not as deep
+        if not (old == 0 or self.keys[i] == key or (old >> 42) & 63 != self.age or depth >= (old >> 32) & 0xFF):
+            i += 1  # always replace slot
+        self.keys[i] = key
+        self.data[i] = (int(score) + SCORE_OFFSET) | (depth << 32) | (bound << 40) | (self.age << 42) | (move_ID << 48)
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    # fraction of the first 1000 slots holding an entry from the current search
+    def fill_rate(self):
+        sample = self.data[:1000]
+        return sum(1 for entry in sample if entry and (entry >> 42) & 63 == self.age) / len(sample)
+
+
+class SharedTranspositionTable(TranspositionTable):
+    # creates the table, or attaches to the one another process created when given its name
+    def __init__(self, size_mb=16, name=None):
+        buckets = bucket_count(size_mb)
+        self.mask = buckets - 1
+        size = 2 * 2 * 8 * buckets  # keys then data, 2 slots per bucket
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.name = self.shm.name
+        self.size_mb = size_mb
+        self.keys = self.shm.buf[:size // 2].cast('Q')
+        self.data = self.shm.buf[size // 2:size].cast('Q')
+        if self.owner:
+            self.clear()
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def clear(self):
+        self.shm.buf[:len(self.keys) * 16] = bytes(len(self.keys) * 16)
+
+    def probe(self, key):
+        self.probes += 1
+        i = (key & self.mask) << 1
+        entry = self.data[i]
+        if not entry or self.keys[i] ^ entry != key:
+            i += 1
+            entry = self.data[i]
+            if not entry or self.keys[i] ^ entry != key:
+                return None
+        self.hits += 1
+        return (entry & 0xFFFFFFFF) - SCORE_OFFSET, (entry >> 32) & 0xFF, (entry >> 40) & 3, entry >> 48
+
+    def store(self, key, depth, score, bound, move_ID=0):
+        self.stores += 1
+        i = (key & self.mask) << 1
+        old = self.data[i]
+        if not (old == 0 or self.keys[i] ^ old == key or (old >> 42) & 63 != self.age or depth >= (old >> 32) & 0xFF):
+            i += 1
+        entry = (int(score) + SCORE_OFFSET) | (depth << 32) | (bound << 40) | (self.age << 42) | (move_ID << 48)
+        self.keys[i] = key ^ entry
+        self.data[i] = entry
+
+    # detach from the shared block, the process that created it also frees it
+    def close(self):
+        self.keys.release()
+        self.data.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,274 @@
+'''
+UCI (Universal Chess Interface) front end, so the engine runs without the window under any UCI
+tournament manager or GUI:
+
+    python -m Chess.uci
+
+Commands come in on stdin and answers go out on stdout. The search runs on its own thread and the
+main thread keeps reading, so stop and ponderhit are handled while it searches: the search checks
+its stop event every 256 nodes. Supported: uci, isready, ucinewgame, setoption (Hash, Threads,
+Ponder, OwnBook, BookFile), position startpos/fen ... moves ..., go (depth, movetime, wtime, btime,
+winc, binc, movestogo, nodes, infinite, ponder), stop, ponderhit and quit. Every finished iteration sends an
+info line with depth, seldepth, score, nodes, nps, time and pv. With OwnBook on, a position in the
+book file (see Chess.book) gets a book move at once instead of a search.
+
+Nothing here imports pygame, ChessMain is the only module that does.
+'''
+import atexit
+import os
+import sys
+import threading
+
+from Chess import ChessEngine, Chess_AI
+from Chess.book import OpeningBook
+from Chess.transposition import TranspositionTable
+
+ENGINE_NAME = 'Chess'
+MAX_HASH_MB = 1024
+MAX_THREADS = os.cpu_count() or 1
+BOOK_FILE = 'book.bin'
+
+
+class UCIEngine:
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.output_lock = threading.Lock()  # info lines come from the search thread
+        self.gs = ChessEngine.GameState(bitboard=True)
+        self.hash_mb = Chess_AI.TT_SIZE_MB
+        self.table = TranspositionTable(self.hash_mb)
+        self.threads = 1
+        self.own_book = False
+        self.book_file = BOOK_FILE
+        self.search_thread = None
+        self.stop_event = threading.Event()  # ends the search
+        self.release_event = threading.Event()  # lets the search thread send bestmove, held back while pondering or infinite
+        self.ponder_time = None  # seconds the search gets once a ponderhit comes
+        self.infinite = False  # go infinite, bestmove only after stop
+        self.timer = None
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+    # handles one command line, returns False on quit
+    def handle(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == 'uci':
+            self.send('id name ' + ENGINE_NAME)
+            self.send('option name Hash type spin default %d min 1 max %d' % (Chess_AI.TT_SIZE_MB, MAX_HASH_MB))
+            self.send('option name Threads type spin default 1 min 1 max %d' % MAX_THREADS)
+            self.send('option name Ponder type check default false')
+            self.send('option name OwnBook type check default false')
+            self.send('option name BookFile type string default ' + BOOK_FILE)
+            self.send('uciok')
+        elif command == 'isready':
+            self.send('readyok')
+        elif command == 'ucinewgame':
+            self.stop()
+            self.table.clear()
+            if Chess_AI.shared_table is not None:
+                Chess_AI.shared_table.clear()
+            for history in Chess_AI.history_scores:
+                history[:] = [0] * len(history)
+        elif command == 'setoption':
+            self.stop()
+            self.set_option(args)
+        elif command == 'position':
+            self.stop()
+            self.set_position(args)
+        elif command == 'go':
+            self.stop()
+            self.go(args)
+        elif command == 'stop':
+            self.stop()
+        elif command == 'ponderhit':
+            self.ponderhit()
+        elif command == 'quit':
+            self.stop()
+            return False
+        return True  # debug, register and unknown commands are ignored, as UCI asks
+
+    # setoption name <name> value <value>
+    def set_option(self, args):
+        if 'name' not in args:
+            return
+        value_at = args.index('value') if 'value' in args else len(args)
+        name = ' '.join(args[args.index('name') + 1:value_at]).lower()
+        value = ' '.join(args[value_at + 1:])
+        try:
+            if name == 'hash':
+                self.hash_mb = max(1, min(int(value), MAX_HASH_MB))
+                self.table = TranspositionTable(self.hash_mb)
+                Chess_AI.TT_SIZE_MB = self.hash_mb  # the size of the shared table of the SMP search
+                if Chess_AI.shared_table is not None:
+                    atexit.unregister(Chess_AI.shared_table.close)
+                    Chess_AI.shared_table.close()
+                    Chess_AI.shared_table = None
+            elif name == 'threads':
+                self.threads = max(1, min(int(value), MAX_THREADS))
+            elif name == 'ownbook':
+                self.own_book = value.lower() == 'true'
+                self.load_book()
+            elif name == 'bookfile':
+                self.book_file = value
+                self.load_book()
+        except ValueError:
+            self.send('info string bad value for %s: %s' % (name, value))
+
+    # opens the book file as Chess_AI.opening_book when OwnBook is on, closes the one open before
+    def load_book(self):
+        if Chess_AI.opening_book is not None:
+            Chess_AI.opening_book.close()
+            Chess_AI.opening_book = None
+        if not self.own_book:
+            return
+        try:
+            Chess_AI.opening_book = OpeningBook(self.book_file)
+        except (OSError, ValueError) as exception:
+            self.send('info string no book: %s' % exception)
+            return
+        self.send('info string book %s, %d moves' % (self.book_file, len(Chess_AI.opening_book)))
+
+    # position startpos|fen <fen> [moves <move> ...], moves in coordinate notation like e2e4 or e7e8q
+    def set_position(self, args):
+        moves_at = args.index('moves') if 'moves' in args else len(args)
+        try:
+            if args and args[0] == 'fen':
+                gs = ChessEngine.GameState.from_fen(' '.join(args[1:moves_at]), bitboard=True)
+            else:
+                gs = ChessEngine.GameState(bitboard=True)
+        except ValueError as exception:
+            self.send('info string ' + str(exception))
+            return
+        for notation in args[moves_at + 1:]:
+            move = find_move(gs.get_valid_moves(), notation)
+            if move is None:
+                self.send('info string illegal move ' + notation)
+                break
+            gs.make_move(move)
+        self.gs = gs
+
+    def go(self, args):
+        options = {}
+        flags = set()
+        i = 0
+        while i < len(args):
+            if args[i] in ('infinite', 'ponder'):
+                flags.add(args[i])
+                i += 1
+            elif args[i] in ('depth', 'movetime', 'wtime', 'btime', 'winc', 'binc', 'movestogo', 'nodes') and i + 1 < len(args):
+                try:
+                    options[args[i]] = int(args[i + 1])
+                except ValueError:
+                    pass
+                i += 2
+            else:  # searchmoves, mate and anything else aren't supported
+                i += 1
+
+        # seconds for this move, None when only depth or nodes limit the search
+        move_time = None
+        remaining = options.get('wtime' if self.gs.white_to_move else 'btime')
+        if 'movetime' in options:
+            move_time = options['movetime'] / 1000
+        elif remaining is not None:
+            increment = options.get('winc' if self.gs.white_to_move else 'binc', 0) / 1000
+            move_time = Chess_AI.allocate_time(remaining / 1000, increment)
+            if options.get('movestogo'):
+                move_time = min(move_time, remaining / 1000 / options['movestogo'])
+        elif 'depth' not in options and 'nodes' not in options:
+            flags.add('infinite')  # a bare go searches until stop
+
+        self.stop_event.clear()
+        self.release_event.clear()
+        self.infinite = 'infinite' in flags
+        self.ponder_time = None
+        if 'ponder' in flags:
+            self.ponder_time = move_time  # the clock only starts at ponderhit
+            move_time = None
+        if not flags:
+            self.release_event.set()
+        self.search_thread = threading.Thread(target=self.search, daemon=True,
+                                              args=(move_time, options.get('nodes'), options.get('depth', Chess_AI.MAX_DEPTH)))
+        self.search_thread.start()
+
+    # runs on the search thread, sends bestmove (and the ponder move it expects) at the end
+    def search(self, move_time, max_nodes, max_depth):
+        gs = self.gs
+        valid_moves = gs.get_valid_moves()
+        if len(valid_moves) == 0:
+            self.release_event.wait()
+            self.send('bestmove 0000')
+            return
+        move_time = move_time if move_time is not None else float('inf')
+        if self.threads > 1:
+            best_move, stats = Chess_AI.find_best_move_smp(gs, valid_moves, self.threads, move_time=move_time, max_nodes=max_nodes,
+                                                           max_depth=max_depth, callback=self.send_info, stop_event=self.stop_event)
+            table = Chess_AI.shared_table
+        else:
+            best_move, stats = Chess_AI.find_best_move(gs, valid_moves, move_time=move_time, max_nodes=max_nodes, max_depth=max_depth,
+                                                       callback=self.send_info, table=self.table, stop_event=self.stop_event)
+            table = self.table
+        if stats.from_book:
+            self.send('info string book move')
+        reply = Chess_AI.expected_reply(gs, best_move, table) if not stats.from_book else None
+        self.release_event.wait()  # while pondering or in infinite mode bestmove waits for stop or ponderhit
+        self.send('bestmove ' + best_move.get_chess_notation() + (' ponder ' + reply.get_chess_notation() if reply is not None else ''))
+
+    # the search callback, an info line per finished iteration
+    def send_info(self, stats):
+        depth, score, nodes, seconds, pv = stats.iterations[-1]
+        if abs(score) >= Chess_AI.MATE_THRESHOLD:
+            score_text = 'mate %d' % Chess_AI.mate_in(score)
+        else:
+            score_text = 'cp %d' % score
+        self.send('info depth %d seldepth %d score %s nodes %d nps %d time %d pv %s' %
+                  (depth, stats.sel_depth, score_text, stats.total_nodes, stats.nps, stats.elapsed * 1000,
+                   ' '.join(move.get_chess_notation() for move in pv)))
+
+    # the opponent played the move pondered on, from now on the search is a normal one with the time go gave it
+    def ponderhit(self):
+        if self.search_thread is None:
+            return
+        if self.ponder_time is not None:
+            self.timer = threading.Timer(self.ponder_time, self.stop_event.set)
+            self.timer.daemon = True
+            self.timer.start()
+        if not self.infinite:
+            self.release_event.set()
+
+    # ends the search if one is running and waits for its bestmove
+    def stop(self):
+        if self.search_thread is None:
+            return
+        self.stop_event.set()
+        self.release_event.set()
+        self.search_thread.join()
+        self.search_thread = None
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+
+# the move of moves in coordinate notation, None if there is none
+def find_move(moves, notation):
+    notation = notation.lower()
+    for move in moves:
+        if move.get_chess_notation() == notation:
+            return move
+    return None
+
+
+def main():
+    engine = UCIEngine()
+    for line in sys.stdin:
+        if not engine.handle(line):
+            break
+    engine.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+'''
+Zobrist keys for hashing positions. Every (piece, square) pair, the side to move, each castling
+right and each en passant file gets a fixed random 64-bit number, and a position's key is the
+XOR of the numbers of everything in it. GameState keeps its hash_key up to date in make_move and
+undo_move by XOR-ing in and out just the parts a move changes.
+The generator is seeded, so the keys (and anything saved with them) are the same on every run.
+'''
+import random
+
+_rng = random.Random(2023)
+
+PIECE_KEYS = {piece: [[_rng.getrandbits(64) for c in range(8)] for r in range(8)]
+              for piece in ('wP', 'wN', 'wB', 'wR', 'wQ', 'wK', 'bP', 'bN', 'bB', 'bR', 'bQ', 'bK')}
+BLACK_TO_MOVE_KEY = _rng.getrandbits(64)
+CASTLING_KEYS = {'wks': _rng.getrandbits(64), 'bks': _rng.getrandbits(64),
+                 'wqs': _rng.getrandbits(64), 'bqs': _rng.getrandbits(64)}
+ENPASSANT_KEYS = [_rng.getrandbits(64) for c in range(8)]  # by file of the en passant square
+
+
+def castling_key(rights):
+    key = 0
+    if rights.wks:
+        key ^= CASTLING_KEYS['wks']
+    if rights.bks:
+        key ^= CASTLING_KEYS['bks']
+    if rights.wqs:
+        key ^= CASTLING_KEYS['wqs']
+    if rights.bqs:
+        key ^= CASTLING_KEYS['bqs']
+    return key
+
+
+def enpassant_key(enpassant_possible):
+    return ENPASSANT_KEYS[enpassant_possible[1]] if enpassant_possible else 0
+
+
+# full recompute, make_move/undo_move only apply the differences
+def compute_hash(board, white_to_move, castling_rights, enpassant_possible):
+    key = 0
+    for r in range(8):
+        for c in range(8):
+            if board[r][c] != '--':
+                key ^= PIECE_KEYS[board[r][c]][r][c]
+    if not white_to_move:
+        key ^= BLACK_TO_MOVE_KEY
+    return key ^ castling_key(castling_rights) ^ enpassant_key(enpassant_possible)
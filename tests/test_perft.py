@@ -0,0 +1,24 @@
+import pytest
+
+from Chess import perft
+
+BACKENDS = {'list': {}, 'mailbox': {'mailbox': True}, 'bitboard': {'bitboard': True}}
+MAX_NODES = 20000  # the deepest count of every suite position under this, so the three backends run in seconds
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('name, fen, counts', perft.SUITE, ids=[name for name, fen, counts in perft.SUITE])
+def test_suite_counts(backend, name, fen, counts):
+    for depth, expected in enumerate(counts, 1):
+        if depth > 1 and expected > MAX_NODES:
+            break
+        assert perft.perft(perft.load_fen(fen, **BACKENDS[backend]), depth) == expected, 'depth %d' % depth
+
+
+# the generators have to agree move for move, not only in the totals
+@pytest.mark.parametrize('name, fen, counts', perft.SUITE[:6], ids=[name for name, fen, counts in perft.SUITE[:6]])
+def test_divide_matches_between_backends(name, fen, counts):
+    divides = []
+    for options in BACKENDS.values():
+        divides.append(sorted((move.get_chess_notation(), nodes) for move, nodes in perft.divide(perft.load_fen(fen, **options), 2)))
+    assert divides[0] == divides[1] == divides[2]
@@ -0,0 +1,76 @@
+import random
+
+import pytest
+
+from Chess import ChessEngine, perft
+
+FENS = [fen for name, fen, counts in perft.SUITE] + [
+    'rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3',
+    'rnbqkbnr/pppp1ppp/8/8/3Pp3/8/PPP1PPPP/RNBQKBNR b KQkq d3 0 2',
+    '4k3/8/8/8/8/8/8/4K3 b - - 47 112',
+]
+
+
+@pytest.mark.parametrize('fen', FENS)
+def test_fen_round_trip(fen):
+    assert perft.load_fen(fen).to_fen() == fen
+
+
+@pytest.mark.parametrize('fen', FENS)
+@pytest.mark.parametrize('bitboard', [False, True])
+def test_pack_round_trip(fen, bitboard):
+    gs = perft.load_fen(fen, bitboard)
+    data = gs.pack()
+    assert len(data) == ChessEngine.SNAPSHOT.size
+    copy = ChessEngine.GameState.unpack(data, bitboard)
+    assert copy.to_fen() == fen
+    assert copy.hash_key == gs.hash_key
+    assert sorted(move.move_ID for move in copy.get_valid_moves()) == sorted(move.move_ID for move in gs.get_valid_moves())
+
+
+# along random games the FEN and snapshot of every position set up the same position again
+def test_round_trips_along_games():
+    random.seed(1)
+    for _ in range(10):
+        gs = perft.load_fen(perft.START_FEN)
+        for _ in range(80):
+            moves = gs.get_valid_moves()
+            if not moves:
+                break
+            gs.make_move(random.choice(moves))
+            fen = gs.to_fen()
+            assert perft.load_fen(fen).to_fen() == fen
+            copy = ChessEngine.GameState.unpack(gs.pack())
+            assert copy.to_fen() == fen and copy.hash_key == gs.hash_key
+
+
+# rights whose king or rook isn't on its home square are dropped, and no castling move is generated
+@pytest.mark.parametrize('fen', [
+    '4k3/8/8/8/8/8/8/4K3 w KQkq - 0 1',
+    '4k3/8/8/8/8/8/8/7K w K - 0 1',
+    '4k3/8/8/8/8/8/8/K7 w Q - 0 1',
+    'r3k2r/8/8/8/8/8/8/R2K3R w KQkq - 0 1',
+])
+def test_castling_rights_without_king_or_rook(fen):
+    gs = perft.load_fen(fen)
+    rights = gs.current_castling_right
+    assert not (rights.wks or rights.wqs)
+    assert not any(move.is_castle_move for move in gs.get_valid_moves())
+    assert gs.to_fen().split()[2] in ('-', 'kq')
+
+
+@pytest.mark.parametrize('fen', [
+    '4k3/8/8/8/8/8/8/R3K2R w KX - 0 1',  # not a castling right
+    'r3k2r/8/8/8/8/8/8/R3K2R w Kkq- - 0 1',  # '-' along with rights
+    'rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq e9 0 2',  # not a square
+    'rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq e 0 2',  # file without a rank
+    'rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq e3 0 2',  # rank 3 with white to move
+    '8/8/8/8/8/8/8/8 w - - 0 1',  # no kings
+    '4k3/8/8/8/8/8/8/8 w - - 0 1',  # no white king
+    '4k3/8/8/8/8/8/8/3KK3 w - - 0 1',  # two white kings
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP w KQkq - 0 1',  # seven ranks
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR x KQkq - 0 1',  # no side to move
+])
+def test_invalid_fen(fen):
+    with pytest.raises(ValueError):
+        perft.load_fen(fen)
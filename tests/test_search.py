@@ -0,0 +1,33 @@
+import pytest
+
+from Chess import Chess_AI, parallel, perft, search_benchmark
+
+
+@pytest.mark.parametrize('fen', parallel.BENCHMARK_FENS)
+@pytest.mark.parametrize('bitboard', [False, True])
+def test_root_split_matches_single_process(fen, bitboard):
+    options = {option: getattr(Chess_AI, option) for option in parallel.SELECTIVE_OPTIONS}
+    gs = perft.load_fen(fen, bitboard)
+    move, score = parallel.single_process_search(gs, 3)
+    parallel_move, stats = parallel.find_best_move_parallel(gs, gs.get_valid_moves(), 3, workers=2)
+    assert stats.score == score
+    assert gs.to_fen() == fen
+    assert {option: getattr(Chess_AI, option) for option in parallel.SELECTIVE_OPTIONS} == options  # switched back on
+
+
+def test_mate_suite():
+    assert search_benchmark.check_mates() == 0
+
+
+def test_parallel_perft():
+    gs = perft.load_fen(perft.SUITE[1][1])
+    assert parallel.parallel_perft(gs, 3, workers=2) == perft.SUITE[1][2][2]
+
+
+# a nearer mate scores higher, mate_in counts moves from the side to move
+def test_mate_distance():
+    gs = perft.load_fen('3k4/8/4K3/8/8/8/8/7R w - - 0 1')  # Rc1 Ke8 Rc8#
+    move, stats = Chess_AI.find_best_move(gs, gs.get_valid_moves(), move_time=float('inf'), max_depth=5)
+    assert stats.score == Chess_AI.CHECKMATE - 3
+    assert Chess_AI.mate_in(stats.score) == 2
+    assert Chess_AI.mate_in(-(Chess_AI.CHECKMATE - 2)) == -1